@@ -0,0 +1,253 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import datetime
+import hashlib
+import json
+import mmap
+import struct
+import threading
+import time
+import zlib
+from config import ARCHIVE_ENABLED, ARCHIVE_DIR
+from db.models import (
+    get_connection, create_archive_tables, create_search_table, create_profile_table, create_cin_table,
+    batch_insert_search, batch_insert_profiles, batch_insert_cin_details
+)
+from api.extract import extract_search_rows, extract_profile, extract_cin
+
+# Segment record layout: magic, sha256 of the raw body, compressed length, zlib payload.
+# Segments are append-only and self-describing, so they can be re-indexed by a scan.
+RECORD_HEADER = struct.Struct(">4s32sI")
+RECORD_MAGIC = b"CINA"
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+FLUSH_SIZE = 200
+# Responses kept in memory while Postgres is unreachable; the oldest are dropped beyond this
+MAX_PENDING = FLUSH_SIZE * 50
+REPLAY_BATCH_SIZE = 5000
+KINDS = ("search", "profile", "cin")
+
+class ArchiveWriter:
+    """Appends raw responses to this process's own segment file and indexes them in Postgres."""
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        create_archive_tables()
+        self.directory = directory
+        self._pending = []
+        # Blobs written to a segment whose index rows are not committed yet: digest -> blob row
+        self._appended = {}
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_name = None
+        self._segment_count = 0
+
+    def _open_segment(self):
+        if self._segment:
+            self._segment.close()
+        self._segment_count += 1
+        self._segment_name = f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{self._segment_count}.seg"
+        self._segment = open(os.path.join(self.directory, self._segment_name), "ab")
+
+    def _append(self, digest, compressed):
+        if self._segment is None or self._segment.tell() >= SEGMENT_MAX_BYTES:
+            self._open_segment()
+        self._segment.write(RECORD_HEADER.pack(RECORD_MAGIC, digest, len(compressed)))
+        offset = self._segment.tell()
+        self._segment.write(compressed)
+        return offset
+
+    def put(self, kind, key, body, ref=None):
+        digest = hashlib.sha256(body).digest()
+        archived_at = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            self._pending.append((kind, key, ref, digest, body, archived_at))
+            if len(self._pending) > MAX_PENDING:
+                dropped = len(self._pending) - MAX_PENDING
+                print(f"⚠️ Archive index unavailable, dropping {dropped} oldest pending responses")
+                del self._pending[:dropped]
+            if len(self._pending) >= FLUSH_SIZE:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            hex_digests = list({pending[3].hex() for pending in self._pending})
+            cur.execute("SELECT digest FROM archive_blobs WHERE digest = ANY(%s)", (hex_digests,))
+            stored = {row[0] for row in cur.fetchall()}
+            blobs = []
+            # One entry per (kind, key, digest): a row can only be upserted once per statement
+            entries = {}
+            for kind, key, ref, digest, body, archived_at in self._pending:
+                hex_digest = digest.hex()
+                if hex_digest not in stored:
+                    # A failed flush already appended this body; reuse it instead of writing it again
+                    if hex_digest not in self._appended:
+                        compressed = zlib.compress(body, 6)
+                        offset = self._append(digest, compressed)
+                        self._appended[hex_digest] = (hex_digest, self._segment_name, offset, len(compressed), len(body))
+                    blobs.append(self._appended[hex_digest])
+                    stored.add(hex_digest)
+                entries[(kind, key, hex_digest)] = (kind, key, ref, hex_digest, archived_at)
+            if self._segment:
+                self._segment.flush()
+                os.fsync(self._segment.fileno())
+            if blobs:
+                args_str = ','.join(cur.mogrify('(%s,%s,%s,%s,%s)', x).decode('utf-8') for x in blobs)
+                cur.execute(
+                    f"""
+                    INSERT INTO archive_blobs (digest, segment, byte_offset, length, raw_length)
+                    VALUES {args_str}
+                    ON CONFLICT (digest) DO NOTHING;
+                    """
+                )
+            # A body seen again (A -> B -> A) moves back to the front for latest_only replays
+            args_str = ','.join(cur.mogrify('(%s,%s,%s,%s,%s)', x).decode('utf-8') for x in entries.values())
+            cur.execute(
+                f"""
+                INSERT INTO archive_index (kind, key, ref, digest, archived_at)
+                VALUES {args_str}
+                ON CONFLICT (kind, key, digest) DO UPDATE SET
+                    archived_at = EXCLUDED.archived_at,
+                    ref = EXCLUDED.ref
+                WHERE EXCLUDED.archived_at > archive_index.archived_at;
+                """
+            )
+            conn.commit()
+            self._pending.clear()
+            self._appended.clear()
+        except Exception as e:
+            print(f"❌ Failed to flush {len(self._pending)} archive records: {e}")
+            conn.rollback()
+        finally:
+            cur.close()
+            conn.close()
+
+    def close(self):
+        self.flush()
+        if self._segment:
+            self._segment.close()
+            self._segment = None
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def archive_response(kind, key, body, ref=None):
+    """Archive a raw response body if ARCHIVE_ENABLED; a no-op otherwise."""
+    global _writer
+    if not ARCHIVE_ENABLED:
+        return
+    try:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ArchiveWriter()
+        _writer.put(kind, key, body, ref)
+    except Exception as e:
+        print(f"⚠️ Failed to archive {kind} response {key}: {e}")
+
+def close_archive():
+    """Flush pending archive records; call before the process exits."""
+    if _writer is not None:
+        _writer.close()
+
+def iter_archived(kind, directory=ARCHIVE_DIR, latest_only=True):
+    """Yield (key, ref, parsed_json) for archived responses of one kind, in segment order.
+
+    With latest_only, only the newest response per key is returned.
+    """
+    conn = get_connection()
+    # Named cursor streams the index instead of loading it all at once
+    cur = conn.cursor(name=f"archive_replay_{kind}")
+    cur.itersize = REPLAY_BATCH_SIZE
+    segments = {}
+    try:
+        if latest_only:
+            cur.execute(
+                """
+                SELECT key, ref, segment, byte_offset, length FROM (
+                    SELECT DISTINCT ON (i.key) i.key, i.ref, b.segment, b.byte_offset, b.length
+                    FROM archive_index i JOIN archive_blobs b ON b.digest = i.digest
+                    WHERE i.kind = %s
+                    ORDER BY i.key, i.archived_at DESC
+                ) latest
+                ORDER BY segment, byte_offset
+                """,
+                (kind,)
+            )
+        else:
+            cur.execute(
+                """
+                SELECT i.key, i.ref, b.segment, b.byte_offset, b.length
+                FROM archive_index i JOIN archive_blobs b ON b.digest = i.digest
+                WHERE i.kind = %s
+                ORDER BY b.segment, b.byte_offset
+                """,
+                (kind,)
+            )
+        for key, ref, segment, offset, length in cur:
+            if segment not in segments:
+                with open(os.path.join(directory, segment), "rb") as f:
+                    segments[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            body = zlib.decompress(segments[segment][offset:offset + length])
+            try:
+                data = json.loads(body)
+            except json.JSONDecodeError:
+                print(f"⚠️ Skipping archived {kind} response {key}: invalid JSON")
+                continue
+            yield key, ref, data
+    finally:
+        for mm in segments.values():
+            mm.close()
+        cur.close()
+        conn.close()
+
+def replay(kinds=KINDS, directory=ARCHIVE_DIR):
+    """Re-run extraction and DB load for archived responses without touching the network."""
+    create_search_table()
+    create_profile_table()
+    create_cin_table()
+    loaders = {
+        "search": batch_insert_search,
+        "profile": batch_insert_profiles,
+        "cin": batch_insert_cin_details,
+    }
+    for kind in kinds:
+        start = time.time()
+        batch = []
+        replayed = 0
+        # Search pages are replayed in full, the rows dedupe on profile_id
+        for key, ref, data in iter_archived(kind, directory, latest_only=(kind != "search")):
+            if kind == "search":
+                batch.extend(extract_search_rows(data.get("content", [])))
+            elif kind == "profile":
+                batch.append(extract_profile(key, data))
+            else:
+                batch.append(extract_cin(ref, key, data))
+            replayed += 1
+            if len(batch) >= REPLAY_BATCH_SIZE:
+                loaders[kind](batch)
+                batch = []
+        loaders[kind](batch)
+        print(f"[✓] Replayed {replayed} archived {kind} responses in {time.time() - start:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw-response archive tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="re-parse archived responses into the database")
+    replay_parser.add_argument("--kind", choices=KINDS, action="append", help="stage to replay (default: all)")
+    replay_parser.add_argument("--dir", default=ARCHIVE_DIR, help="archive directory")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        replay(args.kind or KINDS, args.dir)
+
+if __name__ == "__main__":
+    main()
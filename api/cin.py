@@ -1,6 +1,4 @@
 import requests
-import time
-import random
 import json
 import pika
 import sys
@@ -8,110 +6,79 @@ import os
 
 # Add the parent directory to sys.path to import from db
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from db.models import create_cin_table, batch_insert_cin_details
+from config import RABBITMQ_HOST
+from db.models import create_cin_table, batch_insert_cin_details, create_retry_tables, create_rollup_tables, load_content_hashes
+from api import fetch
+from api.retry import RetryableError, get_attempt, parse_retry_after, schedule_retry, pending_count
+from api.extract import create_empty_record, cin_record_hash, extract_cin
+from api.archive import archive_response, close_archive
 
 BATCH_SIZE = 10
+# (record, retry attempt) pairs waiting to be written
 cin_batch = []
 
-FIXED_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+# cin -> content hash of what is already stored, loaded at startup
+# and updated only once a batch is in Postgres
+known_hashes = {}
 
-def create_empty_record(profile_id, cin, status, error_msg=None):
-    """Create a record for cases where CIN details are not found."""
-    return {
-        "profile_id": profile_id,
-        "cin": cin,
-        "email": "",
-        "incorpdate": "",
-        "registeredAddress": "",
-        "registeredContactNo": "",
-        "status": f"{status}: {error_msg}" if error_msg else status
-    }
+CIN_INFO_URL = "https://api.startupindia.gov.in/sih/api/noauth/dpiit/services/cin/info"
+
+FIXED_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
 
-def process_cin(profile_id, cin, max_retries=1):
+def process_cin(profile_id, cin):
+    """Fetch CIN details once; transient failures raise RetryableError for the delay queue."""
     print(f"[*] Processing CIN: {cin} for profile: {profile_id}")
-    base_headers = {
+    headers = {
         "accept": "application/json, text/javascript, */*; q=0.01",
         "accept-language": "en-US,en;q=0.9",
         "content-type": "application/json",
         "origin": "https://www.startupindia.gov.in",
-        "referer": "https://www.startupindia.gov.in/"
+        "referer": "https://www.startupindia.gov.in/",
+        "user-agent": FIXED_USER_AGENT
     }
-    url = f"https://api.startupindia.gov.in/sih/api/noauth/dpiit/services/cin/info?cin={cin}"
-    attempt = 0
-    backoff = 2
-    while attempt < max_retries:
-        headers = base_headers.copy()
-        headers["user-agent"] = FIXED_USER_AGENT
-        try:
-            response = requests.get(url, headers=headers)
-            print(f"[*] API Response status for {cin}: {response.status_code}")
-            if response.status_code == 429:
-                retry_after = int(response.headers.get("Retry-After", backoff))
-                print(f"⏳ Rate limited. Sleeping for {retry_after} seconds...")
-                time.sleep(retry_after)
-                backoff = min(backoff * 2, 120)  # Cap backoff at 2 minutes
-                attempt += 1
-                continue
-            if response.status_code != 200:
-                error_msg = f"Request failed with status {response.status_code}"
-                print(f"❌ {error_msg}")
-                time.sleep(backoff + random.uniform(0, 2))
-                backoff = min(backoff * 2, 120)
-                attempt += 1
-                continue
-            data = response.json()
-            cin_data = data.get("data", {})
-            if not cin_data:
-                error_msg = "No data returned from API"
-                print(f"⚠️ {error_msg}")
-                return create_empty_record(profile_id, cin, "NO_DATA", error_msg)
-            extracted = {
-                "profile_id": profile_id,
-                "cin": cin_data.get("cin", ""),
-                "email": cin_data.get("email", ""),
-                "incorpdate": cin_data.get("incorpdate", ""),
-                "registeredAddress": cin_data.get("registeredAddress", ""),
-                "registeredContactNo": cin_data.get("registeredContactNo", ""),
-                "status": "SUCCESS"
-            }
-            if not extracted["cin"]:
-                error_msg = "Missing CIN in API response"
-                print(f"⚠️ {error_msg}")
-                return create_empty_record(profile_id, cin, "INVALID_DATA", error_msg)
-            print(f"✅ Successfully extracted data for {cin}: {json.dumps(extracted, indent=2)}")
-            return extracted
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Network error: {str(e)}"
-            print(f"❌ {error_msg}")
-            time.sleep(backoff + random.uniform(0, 2))
-            backoff = min(backoff * 2, 120)
-            attempt += 1
-        except json.JSONDecodeError as e:
-            error_msg = f"Invalid JSON response: {str(e)}"
-            print(f"❌ {error_msg}")
-            return create_empty_record(profile_id, cin, "JSON_ERROR", error_msg)
-        except Exception as e:
-            error_msg = f"Unexpected error: {str(e)}"
-            print(f"❌ {error_msg}")
-            time.sleep(backoff + random.uniform(0, 2))
-            backoff = min(backoff * 2, 120)
-            attempt += 1
-    # If all retries failed
-    return create_empty_record(profile_id, cin, "FAILED", f"Max retries reached after {max_retries} attempts")
+    url = f"{CIN_INFO_URL}?cin={cin}"
+    try:
+        response = fetch.get(url, headers=headers)
+    except requests.exceptions.RequestException as e:
+        raise RetryableError(f"Network error: {str(e)}")
+    print(f"[*] API Response status for {cin}: {response.status_code}")
+    if response.status_code == 429:
+        raise RetryableError("Rate limited", retry_after=parse_retry_after(response))
+    if response.status_code != 200:
+        raise RetryableError(f"Request failed with status {response.status_code}")
+    archive_response("cin", cin, response.content, ref=profile_id)
+    try:
+        data = response.json()
+    except json.JSONDecodeError as e:
+        error_msg = f"Invalid JSON response: {str(e)}"
+        print(f"❌ {error_msg}")
+        record = create_empty_record(profile_id, cin, "JSON_ERROR", error_msg)
+        record["content_hash"] = cin_record_hash(record)
+        return record
+    extracted = extract_cin(profile_id, cin, data)
+    if extracted["status"] != "SUCCESS":
+        print(f"⚠️ {extracted['status']}")
+        return extracted
+    print(f"✅ Successfully extracted data for {cin}: {json.dumps(extracted, indent=2)}")
+    return extracted
 
 def process_batch():
     global cin_batch
     if cin_batch:
-        try:
-            print(f"\n[*] Processing batch of {len(cin_batch)} records...")
-            print(f"[*] Batch contents: {json.dumps(cin_batch, indent=2)}")
-            batch_insert_cin_details(cin_batch)
-            print(f"✅ Successfully inserted batch of {len(cin_batch)} records")
-            cin_batch = []
-        except Exception as e:
-            print(f"❌ Failed to insert batch: {str(e)}")
-            # Don't clear the batch on error, will retry on next batch
-            raise
+        records = [record for record, _ in cin_batch]
+        print(f"\n[*] Processing batch of {len(records)} records...")
+        print(f"[*] Batch contents: {json.dumps(records, indent=2)}")
+        if batch_insert_cin_details(records):
+            print(f"✅ Successfully inserted batch of {len(records)} records")
+            for record in records:
+                known_hashes[record["cin"]] = record.get("content_hash")
+        else:
+            # The messages are already acked; send them back through the delay queue
+            print(f"❌ Failed to insert batch, scheduling {len(records)} CINs for a retry")
+            for record, attempt in cin_batch:
+                body = json.dumps({"profile_id": record["profile_id"], "cin": record["cin"]})
+                schedule_retry('cin_queue', body, attempt, "Failed to save CIN batch")
+        cin_batch = []
 
 def callback(ch, method, properties, body):
     global cin_batch
@@ -126,23 +93,38 @@ def callback(ch, method, properties, body):
             print(f"⚠️ Missing required fields in message: {msg}")
             if cin:  # If we at least have a CIN, store the error
                 record = create_empty_record(profile_id or "UNKNOWN", cin, "INVALID_MESSAGE", "Missing profile_id")
-                cin_batch.append(record)
+                cin_batch.append((record, 0))
             ch.basic_ack(delivery_tag=method.delivery_tag)
             return
             
-        # Process CIN and always get a record (either with data or error status)
-        record = process_cin(profile_id, cin)
-        print(f"[*] Adding to batch (current size: {len(cin_batch)})")
-        cin_batch.append(record)
+        # Wait out a rate-limit window here, where pika keeps the connection alive
+        pause = fetch.rate_limit_remaining(CIN_INFO_URL)
+        if pause:
+            print(f"[~] CIN API is rate limiting, pausing for {pause:.0f}s")
+            ch.connection.sleep(pause)
+
+        # Transient failures go to the delay queue so this worker can move on
+        try:
+            record = process_cin(profile_id, cin)
+        except RetryableError as e:
+            print(f"❌ {e}")
+            schedule_retry('cin_queue', body.decode(), get_attempt(properties), e, e.retry_after)
+            record = None
+        if record:
+            if known_hashes.get(record["cin"]) == record["content_hash"]:
+                print(f"⏭️ CIN {record['cin']} unchanged, skipping")
+            else:
+                print(f"[*] Adding to batch (current size: {len(cin_batch)})")
+                cin_batch.append((record, get_attempt(properties)))
             
         if len(cin_batch) >= BATCH_SIZE:
             process_batch()
                 
         ch.basic_ack(delivery_tag=method.delivery_tag)
         
-        # --- Auto-close logic: check if cin_queue is empty ---
+        # --- Auto-close logic: check if cin_queue is empty and no retries are pending ---
         method_frame = ch.queue_declare(queue='cin_queue', passive=True)
-        if method_frame.method.message_count == 0:
+        if method_frame.method.message_count == 0 and pending_count('cin_queue') == 0:
             print("[!] cin_queue is empty. Flushing remaining batch and shutting down...")
             flush_remaining_batch()
             ch.connection.close()
@@ -161,12 +143,16 @@ def callback(ch, method, properties, body):
 def flush_remaining_batch():
     print("\n[*] Flushing remaining batch...")
     process_batch()
+    close_archive()
 
 print("[*] Creating CIN details table if it doesn't exist...")
 create_cin_table()
+create_retry_tables()
+create_rollup_tables()
+known_hashes.update(load_content_hashes('cin_details', 'cin'))
 
 print("[*] Connecting to RabbitMQ...")
-connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
+connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
 channel = connection.channel()
 channel.queue_declare(queue='cin_queue', durable=True)
 channel.basic_qos(prefetch_count=1)
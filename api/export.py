@@ -6,9 +6,14 @@ from db.models import get_connection
 
 def export_synced_data(limit=150000):
     conn = get_connection()
+    # One row per company: among a company's profiles keep the one with a successful CIN lookup, then the oldest
     query = f"""
-        SELECT profile_id, name, country, state, city, cin, pan, email, incorp_date, registered_address, registered_contact, cin_status, synced_at
-        FROM synced_data
+        SELECT company_id, profile_id, name, country, state, city, cin, pan, email, incorp_date, registered_address, registered_contact, cin_status, synced_at
+        FROM (
+            SELECT DISTINCT ON (COALESCE(company_id::text, profile_id)) *
+            FROM synced_data
+            ORDER BY COALESCE(company_id::text, profile_id), COALESCE(cin_status = 'SUCCESS', false) DESC, id
+        ) per_company
         ORDER BY id
         LIMIT {limit}
     """
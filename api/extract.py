@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.hashing import content_hash
+
+# Pure extraction from API responses, shared by the live stages and archive replay.
+
+def extract_search_rows(content):
+    """(profile_id, name, country, state, city) rows from one page of search results."""
+    return [
+        (item.get("id"), item.get("name"), item.get("country"), item.get("state"), item.get("city"))
+        for item in content
+        if item.get("id")
+    ]
+
+def extract_profile(profile_id, data):
+    """Fields kept from a profile API response."""
+    startup_data = data.get("user", {}).get("startup", {})
+    extracted = {
+        "profile_id": profile_id,
+        "cin": startup_data.get("cin"),
+        "pan": startup_data.get("pan"),
+        "members": startup_data.get("members", [])
+    }
+    extracted["content_hash"] = content_hash(extracted["cin"], extracted["pan"])
+    return extracted
+
+def create_empty_record(profile_id, cin, status, error_msg=None):
+    """Create a record for cases where CIN details are not found."""
+    return {
+        "profile_id": profile_id,
+        "cin": cin,
+        "email": "",
+        "incorpdate": "",
+        "registeredAddress": "",
+        "registeredContactNo": "",
+        "status": f"{status}: {error_msg}" if error_msg else status
+    }
+
+def cin_record_hash(record):
+    return content_hash(
+        record["email"], record["incorpdate"], record["registeredAddress"],
+        record["registeredContactNo"], record["status"]
+    )
+
+def extract_cin(profile_id, cin, data):
+    """cin_details record from a CIN API response, or an empty record with the failure status."""
+    cin_data = data.get("data", {})
+    if not cin_data:
+        record = create_empty_record(profile_id, cin, "NO_DATA", "No data returned from API")
+    else:
+        record = {
+            "profile_id": profile_id,
+            "cin": cin_data.get("cin", ""),
+            "email": cin_data.get("email", ""),
+            "incorpdate": cin_data.get("incorpdate", ""),
+            "registeredAddress": cin_data.get("registeredAddress", ""),
+            "registeredContactNo": cin_data.get("registeredContactNo", ""),
+            "status": "SUCCESS"
+        }
+        if not record["cin"]:
+            record = create_empty_record(profile_id, cin, "INVALID_DATA", "Missing CIN in API response")
+    record["content_hash"] = cin_record_hash(record)
+    return record
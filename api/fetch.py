@@ -0,0 +1,210 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import collections
+import concurrent.futures
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from config import (
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_ITEM_BUDGET,
+    HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_BUDGET
+)
+
+# Need this many observed latencies before hedging kicks in
+MIN_LATENCY_SAMPLES = 50
+LATENCY_WINDOW = 1000
+CHUNK_SIZE = 8 * 1024
+# Pause applied to a host that answers 429 without a usable Retry-After
+DEFAULT_RATE_LIMIT_PAUSE = 30
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The per-item budget ran out before the response was fully read."""
+
+class Deadline:
+    """Overall time budget for fetching one item, shared by all of its attempts."""
+
+    def __init__(self, budget=HTTP_ITEM_BUDGET):
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def timeout(self):
+        """(connect, read) timeouts for the next socket operation, clipped to the budget."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Item deadline exceeded")
+        return (min(HTTP_CONNECT_TIMEOUT, remaining), min(HTTP_READ_TIMEOUT, remaining))
+
+class LatencyTracker:
+    """Sliding window of recent request latencies."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            if len(self._samples) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+class HedgeBudget:
+    """Allow hedges only while they stay under a fixed fraction of all requests."""
+
+    def __init__(self, ratio=HEDGE_BUDGET):
+        self.ratio = ratio
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_acquire(self):
+        with self._lock:
+            if self.hedges + 1 > self.requests * self.ratio:
+                return False
+            self.hedges += 1
+            return True
+
+class HostGate:
+    """Holds every request to a host until its rate-limit window has passed.
+
+    Retry-After applies to the whole host, so one 429 pauses all workers instead of
+    each of them burning a retry attempt on the next item.
+    """
+
+    def __init__(self):
+        self._paused_until = {}
+        self._lock = threading.Lock()
+
+    def pause(self, host, seconds):
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._paused_until[host] = max(self._paused_until.get(host, 0.0), until)
+
+    def remaining(self, host):
+        with self._lock:
+            return max(self._paused_until.get(host, 0.0) - time.monotonic(), 0.0)
+
+    def wait(self, host):
+        while True:
+            remaining = self.remaining(host)
+            if remaining <= 0:
+                return
+            print(f"[~] {host} is rate limiting, waiting {remaining:.0f}s")
+            time.sleep(remaining)
+
+latencies = LatencyTracker()
+host_gate = HostGate()
+hedge_budget = HedgeBudget()
+# Runs attempts when hedging is on; sized for the profile stage's 8 workers plus hedges
+_attempt_executor = concurrent.futures.ThreadPoolExecutor(max_workers=16)
+
+def _response_socket(response):
+    connection = getattr(response.raw, "_connection", None)
+    if getattr(connection, "sock", None) is not None:
+        return connection.sock
+    # Responses read until close have already been detached from their connection
+    reader = getattr(getattr(response.raw, "_fp", None), "fp", None)
+    return getattr(getattr(reader, "raw", None), "_sock", None)
+
+def _abort(response):
+    """Shut the connection down so a read blocked on a slow server returns at once."""
+    sock = _response_socket(response)
+    try:
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+        else:
+            response.raw.close()
+    except OSError:
+        pass
+
+def _attempt(method, url, deadline, **kwargs):
+    start = time.monotonic()
+    response = requests.request(method, url, timeout=deadline.timeout(), stream=True, **kwargs)
+    # The read timeout only bounds each socket read, and a server trickling bytes can keep
+    # every read under it. A watchdog cuts the connection once the item budget is spent.
+    watchdog = threading.Timer(deadline.remaining(), _abort, (response,))
+    watchdog.daemon = True
+    watchdog.start()
+    try:
+        try:
+            content = b"".join(response.iter_content(CHUNK_SIZE))
+        except (requests.exceptions.RequestException, OSError):
+            if deadline.remaining() <= 0:
+                raise DeadlineExceeded(f"Item deadline exceeded while reading {url}")
+            raise
+        # An aborted body without a length can end early instead of raising
+        if deadline.remaining() <= 0:
+            raise DeadlineExceeded(f"Item deadline exceeded while reading {url}")
+        response._content = content
+    finally:
+        watchdog.cancel()
+        response.close()
+    latencies.record(time.monotonic() - start)
+    return response
+
+def rate_limit_remaining(url):
+    """Seconds until requests to url's host are allowed again."""
+    return host_gate.remaining(urlsplit(url).netloc)
+
+def _note_rate_limit(url, response):
+    if response.status_code != 429:
+        return
+    try:
+        pause = int(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        pause = DEFAULT_RATE_LIMIT_PAUSE
+    host_gate.pause(urlsplit(url).netloc, pause)
+
+def request(method, url, deadline=None, **kwargs):
+    """Issue an HTTP request bounded by a Deadline, hedging slow attempts when enabled.
+
+    Waits first while the host is rate limiting; a 429 answer starts such a pause.
+    Raises requests.exceptions.RequestException (including DeadlineExceeded) on failure.
+    """
+    host_gate.wait(urlsplit(url).netloc)
+    response = _request(method, url, deadline, **kwargs)
+    _note_rate_limit(url, response)
+    return response
+
+def _request(method, url, deadline=None, **kwargs):
+    deadline = deadline or Deadline()
+    hedge_budget.count_request()
+    hedge_after = latencies.percentile(HEDGE_PERCENTILE) if HEDGE_ENABLED else None
+    if hedge_after is None or hedge_after >= deadline.remaining():
+        return _attempt(method, url, deadline, **kwargs)
+
+    first = _attempt_executor.submit(_attempt, method, url, deadline, **kwargs)
+    try:
+        return first.result(timeout=hedge_after)
+    except concurrent.futures.TimeoutError:
+        pass
+    if not hedge_budget.try_acquire():
+        return first.result()
+    print(f"[~] Hedging request to {url} after {hedge_after:.2f}s")
+    second = _attempt_executor.submit(_attempt, method, url, deadline, **kwargs)
+    error = None
+    for future in concurrent.futures.as_completed([first, second]):
+        try:
+            return future.result()
+        except requests.exceptions.RequestException as e:
+            error = e
+    raise error
+
+def get(url, deadline=None, **kwargs):
+    return request("GET", url, deadline=deadline, **kwargs)
+
+def post(url, deadline=None, **kwargs):
+    return request("POST", url, deadline=deadline, **kwargs)
@@ -0,0 +1,101 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+from db.models import get_connection, create_search_table, create_search_extensions
+
+# Minimum pg_trgm word similarity for a fuzzy match; lower is more typo tolerant
+WORD_SIMILARITY_THRESHOLD = 0.4
+DEFAULT_LIMIT = 20
+# Fuzzy candidates fetched per requested result before the final ranking
+CANDIDATE_FACTOR = 5
+
+def _like_prefix(query):
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+def search_companies(query, state=None, city=None, limit=DEFAULT_LIMIT):
+    """Ranked, typo-tolerant company-name lookup against the local search table.
+
+    Prefix matches rank first, then fuzzy matches by trigram word similarity.
+    Each branch reads a capped number of rows straight off its index in order, so
+    short queries that match a large part of the table cost the same as long ones.
+    Returns a list of dicts with profile_id, name, state, city and score.
+    """
+    query = (query or "").strip().lower()
+    if not query:
+        return []
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SET LOCAL pg_trgm.word_similarity_threshold = %s", (WORD_SIMILARITY_THRESHOLD,))
+        cur.execute(
+            """
+            SELECT profile_id, name, state, city,
+                   lower(name) LIKE %(prefix)s AS prefix_match,
+                   word_similarity(%(query)s, lower(name)) AS score
+            FROM (
+                (
+                    -- Range scan on the text_pattern_ops index, in index order
+                    SELECT profile_id, name, state, city FROM search
+                    WHERE lower(name) LIKE %(prefix)s
+                      AND (%(state)s IS NULL OR lower(state) = lower(%(state)s))
+                      AND (%(city)s IS NULL OR lower(city) = lower(%(city)s))
+                    ORDER BY lower(name) USING ~<~
+                    LIMIT %(limit)s
+                )
+                UNION
+                (
+                    -- KNN scan on the GiST trigram index, closest names first
+                    SELECT profile_id, name, state, city FROM search
+                    WHERE %(query)s <%% lower(name)
+                      AND (%(state)s IS NULL OR lower(state) = lower(%(state)s))
+                      AND (%(city)s IS NULL OR lower(city) = lower(%(city)s))
+                    ORDER BY %(query)s <<-> lower(name)
+                    LIMIT %(candidates)s
+                )
+            ) candidates
+            ORDER BY prefix_match DESC, score DESC, similarity(%(query)s, lower(name)) DESC, name
+            LIMIT %(limit)s
+            """,
+            {
+                "query": query, "prefix": _like_prefix(query), "state": state, "city": city,
+                "limit": limit, "candidates": limit * CANDIDATE_FACTOR
+            }
+        )
+        return [
+            {"profile_id": profile_id, "name": name, "state": row_state, "city": row_city, "score": float(score)}
+            for profile_id, name, row_state, row_city, _, score in cur.fetchall()
+        ]
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzzy company-name search over the local database.")
+    parser.add_argument("query", nargs="?")
+    parser.add_argument("--setup", action="store_true", help="enable pg_trgm and build the name indexes (once)")
+    parser.add_argument("--state")
+    parser.add_argument("--city")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    if args.setup:
+        create_search_extensions()
+        create_search_table()
+        print("[✓] pg_trgm enabled and name indexes built.")
+        return
+    if not args.query:
+        parser.error("a query is required unless --setup is given")
+
+    start = time.perf_counter()
+    results = search_companies(args.query, args.state, args.city, args.limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for r in results:
+        print(f"{r['score']:.2f}  {r['profile_id']}  {r['name']}  ({r['city']}, {r['state']})")
+    print(f"[✓] {len(results)} matches in {elapsed_ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
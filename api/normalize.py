@@ -0,0 +1,172 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import io
+import re
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+from db.arrow import copy_to_arrow
+
+# Rows per columnar batch pulled from synced_data
+CHUNK_SIZE = 200000
+
+STATES = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat",
+    "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh",
+    "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab", "Rajasthan",
+    "Sikkim", "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal",
+    "Andaman and Nicobar Islands", "Chandigarh", "Dadra and Nagar Haveli and Daman and Diu",
+    "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry",
+]
+# Spellings that show up in registered addresses, mapped to the canonical name
+STATE_ALIASES = {
+    "orissa": "Odisha",
+    "uttaranchal": "Uttarakhand",
+    "pondicherry": "Puducherry",
+    "new delhi": "Delhi",
+    "nct of delhi": "Delhi",
+    "andaman & nicobar islands": "Andaman and Nicobar Islands",
+    "jammu & kashmir": "Jammu and Kashmir",
+    "dadra and nagar haveli": "Dadra and Nagar Haveli and Daman and Diu",
+    "daman and diu": "Dadra and Nagar Haveli and Daman and Diu",
+}
+STATE_LOOKUP = {name.lower(): name for name in STATES}
+STATE_LOOKUP.update(STATE_ALIASES)
+
+# Patterns are RE2 (no lookarounds) so they run inside Arrow's compute kernels.
+# State names are matched against the lower-cased address, longest first.
+STATE_PATTERN = r"\b(?P<state>" + "|".join(
+    re.escape(name) for name in sorted(STATE_LOOKUP, key=len, reverse=True)
+) + r")\b"
+EMAIL_PATTERN = r"^[a-z0-9._%+'-]+@[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}$"
+# Last six-digit group in the address, optionally written as "560 001"
+PINCODE_PATTERN = r"(?:^|\D)(?P<head>[1-9]\d{2})\s?(?P<tail>\d{3})\D*$"
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d-%b-%Y", "%d %b %Y", "%Y/%m/%d", "%d.%m.%Y")
+
+SOURCE_COLUMNS = ["id", "email", "incorp_date", "registered_address", "registered_contact"]
+NORMALIZED_COLUMNS = ["email_normalized", "email_valid", "contact_e164", "incorp_date_parsed", "pincode", "address_state"]
+
+_state_names = pa.array(list(STATE_LOOKUP))
+_state_canonical = pa.array(list(STATE_LOOKUP.values()))
+
+def _first_entry(values, separators):
+    """Fields sometimes hold several values; keep the first one."""
+    values = pc.fill_null(values.cast(pa.string()), "")
+    first = pc.list_element(pc.split_pattern_regex(values, separators, max_splits=1), 0)
+    return pc.utf8_trim_whitespace(first)
+
+def _blank_to_null(values):
+    return pc.if_else(pc.equal(values, ""), pa.scalar(None, pa.string()), values)
+
+def normalize_emails(values):
+    """Lower-cased first email and whether it looks valid."""
+    emails = pc.utf8_lower(_first_entry(values, r"[,;/\s]+"))
+    valid = pc.match_substring_regex(emails, EMAIL_PATTERN)
+    return _blank_to_null(emails), valid
+
+def normalize_phones(values):
+    """Canonicalize Indian numbers to E.164 (+91 and 10 national digits); null when not recognisable."""
+    digits = pc.replace_substring_regex(_first_entry(values, r"[,;/]"), r"\D", "")
+    lengths = pc.utf8_length(digits)
+    national = pc.case_when(
+        pc.make_struct(
+            pc.equal(lengths, 10),
+            pc.and_(pc.equal(lengths, 11), pc.starts_with(digits, "0")),
+            pc.and_(pc.equal(lengths, 12), pc.starts_with(digits, "91")),
+            pc.and_(pc.equal(lengths, 13), pc.starts_with(digits, "091")),
+        ),
+        digits,
+        pc.utf8_slice_codeunits(digits, 1),
+        pc.utf8_slice_codeunits(digits, 2),
+        pc.utf8_slice_codeunits(digits, 3),
+    )
+    valid = pc.fill_null(pc.match_substring_regex(national, r"^[1-9]\d{9}$"), False)
+    return pc.if_else(valid, pc.binary_join_element_wise("+91", national, ""), pa.scalar(None, pa.string()))
+
+def parse_dates(values):
+    """Parse incorporation dates written in any of DATE_FORMATS; null when none match."""
+    values = pc.fill_null(values.cast(pa.string()), "")
+    values = pc.replace_substring_regex(pc.utf8_trim_whitespace(values), r"[T ]\d{1,2}:\d{2}.*$", "")
+    parsed = pa.nulls(len(values), pa.timestamp("s"))
+    for fmt in DATE_FORMATS:
+        if parsed.null_count == 0:
+            break
+        parsed = pc.coalesce(parsed, pc.strptime(values, format=fmt, unit="s", error_is_null=True))
+    return parsed.cast(pa.date32())
+
+def extract_address_parts(values):
+    """(pincode, state) pulled out of free-text registered addresses."""
+    values = pc.fill_null(values.cast(pa.string()), "")
+    pins = pc.extract_regex(values, PINCODE_PATTERN)
+    pincode = pc.binary_join_element_wise(pc.struct_field(pins, "head"), pc.struct_field(pins, "tail"), "")
+    found = pc.struct_field(pc.extract_regex(pc.utf8_lower(values), STATE_PATTERN), "state")
+    state = pc.take(_state_canonical, pc.index_in(found, value_set=_state_names))
+    return pincode, state
+
+def normalize_batch(table):
+    """Vectorized normalization of a batch of synced_data rows.
+
+    Takes an Arrow table with SOURCE_COLUMNS and returns id plus the typed NORMALIZED_COLUMNS.
+    """
+    email_normalized, email_valid = normalize_emails(table["email"])
+    pincode, address_state = extract_address_parts(table["registered_address"])
+    return pa.table({
+        "id": table["id"],
+        "email_normalized": email_normalized,
+        "email_valid": email_valid,
+        "contact_e164": normalize_phones(table["registered_contact"]),
+        "incorp_date_parsed": parse_dates(table["incorp_date"]),
+        "pincode": pincode,
+        "address_state": address_state,
+    })
+
+def _read_chunk(cur, after_id, chunk_size):
+    """Next batch of rows after after_id as an Arrow table."""
+    return copy_to_arrow(
+        cur,
+        f"SELECT {', '.join(SOURCE_COLUMNS)} FROM synced_data WHERE id > %s ORDER BY id LIMIT %s",
+        (after_id, chunk_size),
+        {name: pa.int64() if name == "id" else pa.string() for name in SOURCE_COLUMNS}
+    )
+
+def normalize_synced_data(conn, chunk_size=CHUNK_SIZE):
+    """Normalize every synced_data row in columnar batches and write the typed columns back."""
+    start = time.time()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TEMP TABLE synced_data_normalized (
+            id INTEGER PRIMARY KEY,
+            email_normalized TEXT,
+            email_valid BOOLEAN,
+            contact_e164 TEXT,
+            incorp_date_parsed DATE,
+            pincode TEXT,
+            address_state TEXT
+        ) ON COMMIT DROP;
+    """)
+    total = 0
+    after_id = 0
+    while True:
+        table = _read_chunk(cur, after_id, chunk_size)
+        if table is None:
+            break
+        buf = io.BytesIO()
+        pa_csv.write_csv(normalize_batch(table), buf, pa_csv.WriteOptions(include_header=False))
+        buf.seek(0)
+        cur.copy_expert(
+            f"COPY synced_data_normalized (id, {', '.join(NORMALIZED_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+        total += table.num_rows
+        after_id = pc.max(table["id"]).as_py()
+    cur.execute(f"""
+        UPDATE synced_data s SET
+            {', '.join(f'{col} = n.{col}' for col in NORMALIZED_COLUMNS)}
+        FROM synced_data_normalized n
+        WHERE s.id = n.id;
+    """)
+    conn.commit()
+    cur.close()
+    print(f"[✓] Normalized {total} synced_data rows in {time.time() - start:.1f}s")
@@ -6,7 +6,12 @@ import time
 import random
 import json
 import pika
-from db.models import create_profile_table, batch_insert_profiles
+from config import RABBITMQ_HOST
+from db.models import create_profile_table, batch_insert_profiles, create_retry_tables, load_content_hashes
+from api import fetch
+from api.retry import RetryableError, get_attempt, parse_retry_after, schedule_retry
+from api.extract import extract_profile
+from api.archive import archive_response, close_archive
 import concurrent.futures
 import signal
 import queue
@@ -22,11 +27,16 @@ headers = {
     "user-agent": "Mozilla/5.0"
 }
 
+# (extracted profile, retry attempt) pairs waiting to be written
 batch_profiles = []
 BATCH_SIZE = 10
 
+# profile_id -> content hash of what is already stored, loaded at startup
+# and updated only once a batch is in Postgres
+known_hashes = {}
+
 # Setup RabbitMQ connection for publishing profile_id and cin
-producer_connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
+producer_connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
 producer_channel = producer_connection.channel()
 producer_channel.queue_declare(queue='cin_queue', durable=True)
 
@@ -49,11 +59,18 @@ def save_batch_if_needed(force=False):
     global batch_profiles
     if batch_profiles and (len(batch_profiles) >= BATCH_SIZE or force):
         print(f"💾 Saving batch of {len(batch_profiles)} profiles to Postgres...")
-        batch_insert_profiles(batch_profiles)
+        batch = list(batch_profiles)
         batch_profiles.clear()
+        if batch_insert_profiles([extracted for extracted, _ in batch]):
+            for extracted, _ in batch:
+                known_hashes[extracted["profile_id"]] = extracted["content_hash"]
+        else:
+            # Fetch them again later; known_hashes still says they are not stored
+            for extracted, attempt in batch:
+                schedule_retry('profile_id_queue', extracted["profile_id"], attempt, "Failed to save profile batch")
 
 def publisher_thread_func():
-    connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
+    connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
     channel = connection.channel()
     channel.queue_declare(queue='cin_queue', durable=True)
     while True:
@@ -78,23 +95,34 @@ def publisher_thread_func():
 publisher_thread = threading.Thread(target=publisher_thread_func, daemon=True)
 publisher_thread.start()
 
-def process_profile(profile_id):
+def fetch_profile(profile_id):
     url = f"https://api.startupindia.gov.in/sih/api/common/replica/user/profile/{profile_id}"
-    response = requests.get(url, headers=headers)
+    try:
+        response = fetch.get(url, headers=headers)
+    except requests.exceptions.RequestException as e:
+        raise RetryableError(f"Network error: {str(e)}")
+    if response.status_code == 429:
+        raise RetryableError("Rate limited", retry_after=parse_retry_after(response))
     if response.status_code != 200:
-        print(f"❌ Request failed for profile ID {profile_id} with status {response.status_code}")
+        raise RetryableError(f"Request failed with status {response.status_code}")
+    return response
+
+def process_profile(profile_id, attempt=0):
+    try:
+        response = fetch_profile(profile_id)
+    except RetryableError as e:
+        print(f"❌ Request failed for profile ID {profile_id}: {e}")
+        # Hand the item to the delay queue so this thread can take a fresh one
+        schedule_retry('profile_id_queue', profile_id, attempt, e, e.retry_after)
         return
+    archive_response("profile", profile_id, response.content)
     try:
-        data = response.json()
-        user_data = data.get("user", {})
-        startup_data = user_data.get("startup", {})
-        extracted = {
-            "profile_id": profile_id,
-            "cin": startup_data.get("cin"),
-            "pan": startup_data.get("pan"),
-            "members": startup_data.get("members", [])
-        }
-        batch_profiles.append(extracted)
+        extracted = extract_profile(profile_id, response.json())
+        if known_hashes.get(profile_id) == extracted["content_hash"]:
+            # Unchanged since the last crawl: no DB write and no CIN re-fetch
+            print(f"⏭️ Profile {profile_id} unchanged, skipping")
+            return
+        batch_profiles.append((extracted, attempt))
         # Put message onto the publish queue instead of publishing directly
         msg = json.dumps({"profile_id": profile_id, "cin": extracted["cin"] or ""})
         publish_queue.put(msg)
@@ -114,10 +142,10 @@ def consumer_process(profile_id_queue):
             ch.basic_ack(delivery_tag=method.delivery_tag)
             ch.stop_consuming()
             return
-        profile_id_queue.put(profile_id)
+        profile_id_queue.put((profile_id, get_attempt(properties)))
         ch.basic_ack(delivery_tag=method.delivery_tag)
     print("[x] Consumer process: Waiting for profile IDs from RabbitMQ. To exit press CTRL+C")
-    connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
+    connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
     channel = connection.channel()
     channel.queue_declare(queue='profile_id_queue', durable=True)
     channel.basic_qos(prefetch_count=1)
@@ -141,15 +169,17 @@ if __name__ == "__main__":
     consumer_proc.start()
 
     create_profile_table()
+    create_retry_tables()
+    known_hashes.update(load_content_hashes('profile', 'profile_id'))
     print("[x] Main process: Waiting for profile IDs from consumer process...")
     try:
         while not graceful_shutdown:
             try:
-                profile_id = mp_profile_id_queue.get(timeout=1)
+                profile_id, attempt = mp_profile_id_queue.get(timeout=1)
                 if profile_id == 'STOP':
                     print("[x] Main process: Received STOP signal. Initiating shutdown.")
                     break
-                executor.submit(process_profile, profile_id)
+                executor.submit(process_profile, profile_id, attempt)
             except queue.Empty:
                 # If the consumer process is no longer alive and queue is empty, break
                 if not consumer_proc.is_alive():
@@ -162,6 +192,7 @@ if __name__ == "__main__":
         print("[!] Cleaning up: waiting for threads to finish and closing connections...")
         executor.shutdown(wait=True)
         save_batch_if_needed(force=True)
+        close_archive()
         publish_queue.put(PUBLISH_SENTINEL)
         publisher_thread.join()
         consumer_proc.terminate()
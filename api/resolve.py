@@ -0,0 +1,229 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import re
+import time
+from db.models import get_connection, create_company_tables, create_search_table, create_profile_table
+
+# Legal-form suffixes dropped before comparing names
+NAME_SUFFIX_PATTERN = re.compile(
+    r"\b(private limited|pvt\.? ?ltd\.?|pvt|private|limited|ltd\.?|llp|opc|incorporated|inc\.?)\s*$"
+)
+NON_ALNUM_PATTERN = re.compile(r"[^a-z0-9]+")
+
+def normalize_name(name):
+    """Lower-cased company name without punctuation or trailing legal-form suffixes."""
+    name = (name or "").lower().replace("&", " and ")
+    previous = None
+    while previous != name:
+        previous = name
+        name = NAME_SUFFIX_PATTERN.sub("", name.strip(" .,-"))
+    return NON_ALNUM_PATTERN.sub(" ", name).strip()
+
+def _clean(value):
+    value = (value or "").strip().upper()
+    return value or None
+
+def identity_keys(cin, pan):
+    """Keys that put two profiles in the same company when they share any one of them."""
+    keys = []
+    if cin:
+        keys.append(("cin", cin))
+    if pan:
+        keys.append(("pan", pan))
+    return keys
+
+class UnionFind:
+    """Disjoint sets of nodes that also track the CINs and PANs seen in each set."""
+
+    def __init__(self):
+        self.parent = {}
+        self.identifiers = {}
+
+    def add(self, node, cin=None, pan=None):
+        cins, pans = self.identifiers.setdefault(self.find(node), (set(), set()))
+        if cin:
+            cins.add(cin)
+        if pan:
+            pans.add(pan)
+
+    def find(self, node):
+        self.parent.setdefault(node, node)
+        root = node
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[node] != root:
+            self.parent[node], node = root, self.parent[node]
+        return root
+
+    def conflicts(self, a, b):
+        """True when both sets carry CINs (or PANs) and none of them match."""
+        cins_a, pans_a = self.identifiers.get(self.find(a), (set(), set()))
+        cins_b, pans_b = self.identifiers.get(self.find(b), (set(), set()))
+        return bool(cins_a and cins_b and not cins_a & cins_b) or bool(pans_a and pans_b and not pans_a & pans_b)
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+            cins, pans = self.identifiers.setdefault(root_a, (set(), set()))
+            cins_b, pans_b = self.identifiers.pop(root_b, (set(), set()))
+            cins |= cins_b
+            pans |= pans_b
+
+def resolve_companies():
+    """Assign every profile a persistent company_id, touching only new or changed profiles.
+
+    Profiles sharing a CIN or a PAN end up in the same company. A normalized name plus
+    city only proposes a merge: it is refused when both sides carry CINs or PANs that
+    differ, so two legal entities with the same trading name stay apart. Existing
+    companies keep their ids; when a new profile links two of them they are merged
+    into the lower id.
+    """
+    start = time.time()
+    create_search_table()
+    create_profile_table()
+    create_company_tables()
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        # Profiles that are unmapped, or whose CIN/PAN changed since they were mapped
+        cur.execute("""
+            SELECT s.profile_id, s.name, s.city, p.cin, p.pan, cp.company_id
+            FROM search s
+            LEFT JOIN profile p ON p.profile_id = s.profile_id
+            LEFT JOIN company_profiles cp ON cp.profile_id = s.profile_id
+            WHERE cp.profile_id IS NULL
+               OR cp.cin IS DISTINCT FROM upper(nullif(trim(p.cin), ''))
+               OR cp.pan IS DISTINCT FROM upper(nullif(trim(p.pan), ''))
+        """)
+        pending = []
+        # Companies the changed profiles belonged to; they may end up empty
+        previous_company_ids = set()
+        for profile_id, name, city, cin, pan, previous_company_id in cur.fetchall():
+            if previous_company_id is not None:
+                previous_company_ids.add(previous_company_id)
+            name_key = normalize_name(name)
+            city_key = normalize_name(city)
+            pending.append((profile_id, _clean(cin), _clean(pan), f"{name_key}|{city_key}" if name_key and city_key else None))
+        if not pending:
+            print("[✓] Company mapping is up to date.")
+            return 0
+        pending_ids = [p[0] for p in pending]
+
+        # Only companies sharing a key with a pending profile can change. Load every
+        # profile of those companies so the CIN/PAN conflict check sees all of them.
+        cur.execute(
+            """
+            SELECT company_id, cin, pan, name_key FROM company_profiles
+            WHERE company_id IN (
+                SELECT company_id FROM company_profiles WHERE cin = ANY(%(cins)s)
+                UNION
+                SELECT company_id FROM company_profiles WHERE pan = ANY(%(pans)s)
+                UNION
+                SELECT company_id FROM company_profiles WHERE name_key = ANY(%(name_keys)s)
+            )
+            AND NOT (profile_id = ANY(%(pending_ids)s))
+            """,
+            {
+                "cins": list({p[1] for p in pending if p[1]}),
+                "pans": list({p[2] for p in pending if p[2]}),
+                "name_keys": list({p[3] for p in pending if p[3]}),
+                "pending_ids": pending_ids,
+            }
+        )
+        nodes = []
+        for company_id, cin, pan, name_key in cur.fetchall():
+            nodes.append((("company", company_id), cin, pan, name_key))
+        for profile_id, cin, pan, name_key in pending:
+            nodes.append((("profile", profile_id), cin, pan, name_key))
+
+        # A shared CIN or PAN is the same legal entity: merge outright
+        uf = UnionFind()
+        key_owner = {}
+        name_candidates = {}
+        for node, cin, pan, name_key in nodes:
+            uf.add(node, cin, pan)
+            for key in identity_keys(cin, pan):
+                owner = key_owner.setdefault(key, node)
+                if owner != node:
+                    uf.union(owner, node)
+            if name_key:
+                name_candidates.setdefault(name_key, []).append(node)
+
+        # Same name and city: join the first earlier candidate whose identifiers do not disagree
+        for candidates in name_candidates.values():
+            for i, node in enumerate(candidates[1:], 1):
+                for other in candidates[:i]:
+                    if uf.find(other) == uf.find(node):
+                        break
+                    if not uf.conflicts(other, node):
+                        uf.union(other, node)
+                        break
+
+        clusters = {}
+        for node in list(uf.parent):
+            clusters.setdefault(uf.find(node), []).append(node)
+
+        assignments = {}
+        merged = 0
+        for members in clusters.values():
+            company_ids = sorted(value for kind, value in members if kind == "company")
+            profile_ids = [value for kind, value in members if kind == "profile"]
+            if company_ids:
+                company_id = company_ids[0]
+                if len(company_ids) > 1:
+                    # This cluster joined several existing companies; fold them into the lowest id
+                    cur.execute(
+                        "UPDATE company_profiles SET company_id = %s WHERE company_id = ANY(%s)",
+                        (company_id, company_ids[1:])
+                    )
+                    cur.execute("DELETE FROM companies WHERE company_id = ANY(%s)", (company_ids[1:],))
+                    merged += len(company_ids) - 1
+            else:
+                cur.execute("INSERT INTO companies DEFAULT VALUES RETURNING company_id")
+                company_id = cur.fetchone()[0]
+            for profile_id in profile_ids:
+                assignments[profile_id] = company_id
+
+        rows = [(profile_id, assignments[profile_id], cin, pan, name_key) for profile_id, cin, pan, name_key in pending]
+        args_str = ','.join(cur.mogrify('(%s,%s,%s,%s,%s)', x).decode('utf-8') for x in rows)
+        cur.execute(
+            f"""
+            INSERT INTO company_profiles (profile_id, company_id, cin, pan, name_key)
+            VALUES {args_str}
+            ON CONFLICT (profile_id) DO UPDATE SET
+                company_id = EXCLUDED.company_id,
+                cin = EXCLUDED.cin,
+                pan = EXCLUDED.pan,
+                name_key = EXCLUDED.name_key;
+            """
+        )
+        # Refresh representative identifiers and drop companies whose profiles all moved away
+        cur.execute("""
+            UPDATE companies c SET
+                cin = agg.cin, pan = agg.pan, name_key = agg.name_key, updated_at = CURRENT_TIMESTAMP
+            FROM (
+                SELECT company_id, MIN(cin) AS cin, MIN(pan) AS pan, MIN(name_key) AS name_key
+                FROM company_profiles
+                WHERE company_id = ANY(%s)
+                GROUP BY company_id
+            ) agg
+            WHERE c.company_id = agg.company_id;
+            DELETE FROM companies c
+            WHERE c.company_id = ANY(%s)
+              AND NOT EXISTS (SELECT 1 FROM company_profiles cp WHERE cp.company_id = c.company_id);
+        """, (list(set(assignments.values())), list(previous_company_ids)))
+        conn.commit()
+        print(f"[✓] Resolved {len(pending)} profiles into {len(set(assignments.values()))} companies "
+              f"({merged} merged) in {time.time() - start:.1f}s")
+        return len(pending)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == "__main__":
+    resolve_companies()
@@ -0,0 +1,266 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import random
+import pika
+from config import RABBITMQ_HOST
+from db.models import get_connection, create_retry_tables
+
+# Queues the scheduler republishes to RabbitMQ. Other queue names (e.g. the
+# search pages) are drained directly by their owning stage via claim_due().
+BROKER_QUEUES = ("profile_id_queue", "cin_queue")
+SEARCH_PAGE_QUEUE = "search_page"
+
+ATTEMPT_HEADER = "x-retry-attempt"
+MAX_ATTEMPTS = 6
+BASE_DELAY = 30
+MAX_DELAY = 3600
+POLL_INTERVAL = 5
+SCHEDULER_BATCH_SIZE = 100
+# A claimed item becomes due again after this long unless its owner finishes it
+CLAIM_TIMEOUT = 300
+
+class RetryableError(Exception):
+    """A transient failure that should be retried later instead of inline."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def get_attempt(properties):
+    """Read the retry attempt count from RabbitMQ message properties."""
+    headers = getattr(properties, "headers", None) or {}
+    try:
+        return int(headers.get(ATTEMPT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+def parse_retry_after(response):
+    """Return the Retry-After header in seconds, if the server sent a usable one."""
+    try:
+        return int(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def compute_delay(attempt, retry_after=None):
+    """Exponential backoff with jitter, never shorter than a server Retry-After."""
+    delay = min(BASE_DELAY * (2 ** (attempt - 1)), MAX_DELAY)
+    delay = delay * random.uniform(0.5, 1.0)
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
+
+def schedule_retry(queue_name, body, attempt, error, retry_after=None, retry_id=None):
+    """Park a failed item in the delay queue, or dead-letter it once it has used up its attempts.
+
+    `attempt` is the number of failures the item had before this one. `retry_id` is
+    the row from claim_due() this attempt came from; it is replaced in the same transaction.
+    """
+    failures = attempt + 1
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        if retry_id is not None:
+            cur.execute("DELETE FROM retry_queue WHERE id = %s", (retry_id,))
+        if failures >= MAX_ATTEMPTS:
+            cur.execute(
+                """
+                INSERT INTO dead_letters (queue_name, body, attempts, last_error)
+                VALUES (%s, %s, %s, %s)
+                """,
+                (queue_name, body, failures, str(error))
+            )
+            print(f"☠️ Dead-lettered {queue_name} item after {failures} attempts: {body}")
+        else:
+            delay = compute_delay(failures, retry_after)
+            cur.execute(
+                """
+                INSERT INTO retry_queue (queue_name, body, attempt, last_error, next_attempt_at)
+                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 second')
+                """,
+                (queue_name, body, failures, str(error), delay)
+            )
+            print(f"⏳ Scheduled retry {failures}/{MAX_ATTEMPTS - 1} for {queue_name} item in {delay:.0f}s: {body}")
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Failed to schedule retry for {queue_name} item {body}: {e}")
+        conn.rollback()
+    finally:
+        cur.close()
+        conn.close()
+
+def _claim_due(cur, queue_name, limit):
+    cur.execute(
+        """
+        DELETE FROM retry_queue
+        WHERE id IN (
+            SELECT id FROM retry_queue
+            WHERE queue_name = %s AND next_attempt_at <= CURRENT_TIMESTAMP
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING body, attempt
+        """,
+        (queue_name, limit)
+    )
+    return cur.fetchall()
+
+def claim_due(queue_name, limit=1):
+    """Claim up to `limit` due items and return (id, body, attempt) rows.
+
+    Claimed rows stay in the table with their due time pushed CLAIM_TIMEOUT ahead.
+    Call finish_retry() or schedule_retry(..., retry_id=id) once an item is handled;
+    if the process dies first, the item simply becomes due again.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            UPDATE retry_queue SET next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id IN (
+                SELECT id FROM retry_queue
+                WHERE queue_name = %s AND next_attempt_at <= CURRENT_TIMESTAMP
+                ORDER BY next_attempt_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, body, attempt
+            """,
+            (CLAIM_TIMEOUT, queue_name, limit)
+        )
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+        conn.close()
+
+def finish_retry(retry_id):
+    """Drop a claimed item from the delay queue after it succeeded."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM retry_queue WHERE id = %s", (retry_id,))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def pending_count(queue_name):
+    """Number of items still waiting in the delay queue for queue_name."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) FROM retry_queue WHERE queue_name = %s", (queue_name,))
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+def seconds_until_next_due(queue_name):
+    """Seconds until the earliest pending retry for queue_name, or None if there is none."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT EXTRACT(EPOCH FROM MIN(next_attempt_at) - CURRENT_TIMESTAMP)
+            FROM retry_queue WHERE queue_name = %s
+            """,
+            (queue_name,)
+        )
+        remaining = cur.fetchone()[0]
+        return None if remaining is None else max(float(remaining), 0.0)
+    finally:
+        cur.close()
+        conn.close()
+
+def replay_dead_letters(queue_name=None):
+    """Move dead letters back into the delay queue with a fresh attempt budget."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            WITH moved AS (
+                DELETE FROM dead_letters
+                WHERE %s IS NULL OR queue_name = %s
+                RETURNING queue_name, body, last_error
+            )
+            INSERT INTO retry_queue (queue_name, body, attempt, last_error, next_attempt_at)
+            SELECT queue_name, body, 0, last_error, CURRENT_TIMESTAMP FROM moved
+            """,
+            (queue_name, queue_name)
+        )
+        replayed = cur.rowcount
+        conn.commit()
+        print(f"[✓] Replayed {replayed} dead letters{f' from {queue_name}' if queue_name else ''}.")
+        return replayed
+    finally:
+        cur.close()
+        conn.close()
+
+def run_scheduler():
+    """Republish due retries to their RabbitMQ queues until interrupted."""
+    create_retry_tables()
+    connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
+    channel = connection.channel()
+    # Publishes return only once the broker has the message
+    channel.confirm_delivery()
+    for queue_name in BROKER_QUEUES:
+        channel.queue_declare(queue=queue_name, durable=True)
+    conn = get_connection()
+    cur = conn.cursor()
+    print("[*] Retry scheduler running. To exit press CTRL+C")
+    try:
+        while True:
+            published = 0
+            for queue_name in BROKER_QUEUES:
+                try:
+                    rows = _claim_due(cur, queue_name, SCHEDULER_BATCH_SIZE)
+                    for body, attempt in rows:
+                        channel.basic_publish(
+                            exchange='',
+                            routing_key=queue_name,
+                            body=body,
+                            properties=pika.BasicProperties(
+                                delivery_mode=2,
+                                headers={ATTEMPT_HEADER: attempt}
+                            )
+                        )
+                    # Only drop the rows once every message is on the broker
+                    conn.commit()
+                    published += len(rows)
+                except Exception as e:
+                    print(f"❌ Failed to republish retries for {queue_name}: {e}")
+                    conn.rollback()
+            if published:
+                print(f"[→] Republished {published} due retries")
+            else:
+                connection.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print("\n[!] Retry scheduler stopped.")
+    finally:
+        cur.close()
+        conn.close()
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Delayed-retry scheduler and dead-letter tools.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("run", help="republish due retries (default)")
+    replay_parser = subparsers.add_parser("replay", help="requeue dead letters for another round of retries")
+    replay_parser.add_argument("--queue", help="only replay dead letters from this queue")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        create_retry_tables()
+        replay_dead_letters(args.queue)
+    else:
+        run_scheduler()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+from db.models import get_connection, rebuild_rollups, ROLLUP_DIMENSIONS
+
+DIMENSIONS = [name for table in ROLLUP_DIMENSIONS.values() for name, _ in table]
+
+def get_rollup(dimension, limit=None):
+    """Counts for every value of one dimension, largest first.
+
+    Reads the precomputed company_rollups rows, so the cost does not grow with synced_data.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown rollup dimension '{dimension}', expected one of {DIMENSIONS}")
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT value, profiles, with_email, with_contact
+            FROM company_rollups
+            WHERE dimension = %s AND profiles > 0
+            ORDER BY profiles DESC, value
+            LIMIT %s
+            """,
+            (dimension, limit)
+        )
+        return [
+            {"value": value, "profiles": profiles, "with_email": with_email, "with_contact": with_contact}
+            for value, profiles, with_email, with_contact in cur.fetchall()
+        ]
+    finally:
+        cur.close()
+        conn.close()
+
+def get_coverage():
+    """Totals and email/contact coverage across synced_data."""
+    rows = get_rollup("all")
+    total = rows[0] if rows else {"value": "", "profiles": 0, "with_email": 0, "with_contact": 0}
+    profiles = total["profiles"]
+    return {
+        "profiles": profiles,
+        "with_email": total["with_email"],
+        "with_contact": total["with_contact"],
+        "email_coverage": total["with_email"] / profiles if profiles else 0.0,
+        "contact_coverage": total["with_contact"] / profiles if profiles else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Query precomputed company statistics.")
+    parser.add_argument("dimension", nargs="?", choices=DIMENSIONS + ["coverage", "rebuild"], default="coverage")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    if args.dimension == "rebuild":
+        rebuild_rollups()
+        print("[✓] company_rollups rebuilt.")
+    elif args.dimension == "coverage":
+        coverage = get_coverage()
+        print(f"profiles: {coverage['profiles']}")
+        print(f"with email: {coverage['with_email']} ({coverage['email_coverage']:.1%})")
+        print(f"with contact: {coverage['with_contact']} ({coverage['contact_coverage']:.1%})")
+    else:
+        for row in get_rollup(args.dimension, args.limit):
+            print(f"{row['value'] or '(unknown)'}\t{row['profiles']}\t{row['with_email']}\t{row['with_contact']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,28 @@
 import requests
 import json
 import time
-import random
 import string
 import pika
 import os
-from db.models import create_search_table, get_connection
+import sys
+from config import RABBITMQ_HOST
+from db.models import create_search_table, create_retry_tables, get_connection
+from api import fetch
+from api.archive import archive_response, close_archive
+from api.extract import extract_search_rows
+from api.retry import (
+    SEARCH_PAGE_QUEUE, RetryableError, parse_retry_after, claim_due, finish_retry, schedule_retry,
+    seconds_until_next_due
+)
 import subprocess
 
 SEARCH_API_URL = "https://api.startupindia.gov.in/sih/api/noauth/search/profiles"
 PROGRESS_FILE = "search_progress.json"
+# Give up on a letter for this run after this many failed pages in a row
+MAX_CONSECUTIVE_PAGE_FAILURES = 5
+# Delta refresh: newest profiles first, stop a letter after this many pages with nothing new
+DELTA_SORT_FIELD = "registeredOn"
+DELTA_STOP_PAGES = 3
 
 FIXED_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
 
@@ -59,16 +72,21 @@ def load_progress():
         'current_letter': 'A',
         'current_page': 0,
         'processed_ids': [],
-        'completed_letters': []
+        'completed_letters': [],
+        'resume_pages': {}
     }
 
-def save_progress(letter, page, processed_ids, completed_letters):
-    """Save the current progress to file."""
+def save_progress(letter, page, processed_ids, completed_letters, resume_pages):
+    """Save the current progress to file.
+
+    resume_pages maps letters given up after repeated failures to the page the next run resumes from.
+    """
     progress = {
         'current_letter': letter,
         'current_page': page,
         'processed_ids': list(processed_ids),  # Convert set to list for JSON
-        'completed_letters': list(completed_letters)
+        'completed_letters': list(completed_letters),
+        'resume_pages': resume_pages
     }
     try:
         with open(PROGRESS_FILE, 'w') as f:
@@ -77,45 +95,117 @@ def save_progress(letter, page, processed_ids, completed_letters):
     except Exception as e:
         print(f"⚠️ Error saving progress: {e}")
 
-def check_duplicate_id(cur, profile_id):
-    """Check if profile_id already exists in database."""
-    cur.execute("SELECT EXISTS(SELECT 1 FROM search WHERE profile_id = %s)", (profile_id,))
-    return cur.fetchone()[0]
-
-def make_search_api_request(payload, max_retries=5):
-    attempt = 0
-    backoff = 2
-    while attempt < max_retries:
-        headers = HEADERS.copy()
-        headers["user-agent"] = FIXED_USER_AGENT
+def make_search_api_request(payload):
+    """Make a single search request; transient failures raise RetryableError."""
+    headers = HEADERS.copy()
+    headers["user-agent"] = FIXED_USER_AGENT
+    try:
+        response = fetch.post(SEARCH_API_URL, headers=headers, json=payload)
+    except requests.exceptions.RequestException as e:
+        raise RetryableError(f"Network error: {str(e)}")
+    if response.status_code == 429:
+        raise RetryableError("Rate limited", retry_after=parse_retry_after(response))
+    if response.status_code != 200:
+        raise RetryableError(f"Request failed with status {response.status_code}")
+    return response
+
+def fetch_search_page(letter, page, delta=False):
+    payload = BASE_PAYLOAD.copy()
+    payload["query"] = letter
+    payload["page"] = page
+    if delta:
+        payload["sort"] = {"orders": [{"field": DELTA_SORT_FIELD, "direction": "DESC"}]}
+    response = make_search_api_request(payload)
+    archive_response("search", f"{letter}:{page}", response.content, ref="delta" if delta else None)
+    try:
+        return response.json()
+    except ValueError as e:
+        raise RetryableError(f"Invalid JSON response: {str(e)}")
+
+def store_search_results(content, cur, conn, channel, processed_ids, requeue_known=False):
+    """Insert new profiles from one page of search results and queue them for the profile stage.
+
+    Only IDs this insert actually created are published, so concurrent crawler
+    nodes never queue the same profile twice. With requeue_known, already stored IDs
+    on the page are queued as well so the profile stage can pick up changes.
+    Returns the number of new profiles, or None if nothing could be stored.
+    """
+    batch = [row for row in extract_search_rows(content) if row[0] not in processed_ids]
+    if not batch:
+        return 0
+
+    # Insert and publish in one transaction: the rows are only committed once every
+    # new ID is on the broker, so a crash in between leaves them to be inserted and
+    # queued again instead of stored but never queued.
+    try:
+        args_str = ','.join(cur.mogrify('(%s,%s,%s,%s,%s)', x).decode('utf-8') for x in batch)
+        cur.execute(
+            f"""
+            INSERT INTO search (profile_id, name, country, state, city)
+            VALUES {args_str}
+            ON CONFLICT (profile_id) DO NOTHING
+            RETURNING profile_id
+            """
+        )
+        inserted = [row[0] for row in cur.fetchall()]
+
+        # Send to RabbitMQ queue
+        for profile_id in ([row[0] for row in batch] if requeue_known else inserted):
+            channel.basic_publish(
+                exchange='',
+                routing_key='profile_id_queue',
+                body=profile_id,
+                properties=pika.BasicProperties(
+                    delivery_mode=2,  # Make message persistent
+                )
+            )
+        conn.commit()
+    except Exception as e:
+        print(f"  ❌ Failed to store and queue search results: {e}")
+        conn.rollback()
+        return None
+
+    processed_ids.update(row[0] for row in batch)
+    if inserted:
+        print(f"  ✅ Inserted {len(inserted)} new profiles")
+    if requeue_known and len(batch) > len(inserted):
+        print(f"  🔁 Re-queued {len(batch) - len(inserted)} known profiles for a change check")
+    return len(inserted)
+
+def retry_due_search_pages(cur, conn, channel, processed_ids, limit=None):
+    """Re-fetch failed search pages whose retry time has come, claiming one page at a time.
+
+    Stops after `limit` pages when given, so callers holding a lease can bound the work.
+    """
+    retried = 0
+    while limit is None or retried < limit:
+        retried += 1
+        claimed = claim_due(SEARCH_PAGE_QUEUE)
+        if not claimed:
+            return
+        retry_id, body, attempt = claimed[0]
+        item = json.loads(body)
+        print(f"  🔁 Retrying page {item['page']} for query '{item['letter']}' (attempt {attempt + 1})...")
         try:
-            response = requests.post(SEARCH_API_URL, headers=headers, json=payload)
-            if response.status_code == 429:
-                retry_after = int(response.headers.get("Retry-After", backoff))
-                print(f"⏳ Rate limited. Sleeping for {retry_after} seconds...")
-                time.sleep(retry_after)
-                backoff = min(backoff * 2, 120)
-                attempt += 1
-                continue
-            if response.status_code != 200:
-                print(f"❌ Request failed with status {response.status_code}")
-                time.sleep(backoff + random.uniform(0, 2))
-                backoff = min(backoff * 2, 120)
-                attempt += 1
-                continue
-            return response
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Network error: {str(e)}")
-            time.sleep(backoff + random.uniform(0, 2))
-            backoff = min(backoff * 2, 120)
-            attempt += 1
-    print(f"❌ Max retries reached for payload: {payload}")
-    return None
+            data = fetch_search_page(item["letter"], item["page"], item.get("delta", False))
+        except RetryableError as e:
+            print(f"  ❌ Retry failed for page {item['page']} of query '{item['letter']}': {e}")
+            schedule_retry(SEARCH_PAGE_QUEUE, body, attempt, e, e.retry_after, retry_id=retry_id)
+            continue
+        stored = store_search_results(
+            data.get("content", []), cur, conn, channel, processed_ids, requeue_known=item.get("delta", False)
+        )
+        if stored is None:
+            schedule_retry(SEARCH_PAGE_QUEUE, body, attempt, "Failed to store results", retry_id=retry_id)
+            continue
+        finish_retry(retry_id)
 
 def fetch_and_store_profiles(output_file="startup_profiles_filtered_xxx.json"):
     # Setup RabbitMQ connection
-    connection = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
+    connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
     channel = connection.channel()
+    # Publishes return only once the broker has the message
+    channel.confirm_delivery()
     channel.queue_declare(queue='profile_id_queue', durable=True)
 
     # Load progress from file
@@ -124,6 +214,7 @@ def fetch_and_store_profiles(output_file="startup_profiles_filtered_xxx.json"):
     current_page = progress['current_page']
     processed_ids = set(progress['processed_ids'])
     completed_letters = set(progress['completed_letters'])
+    resume_pages = progress.get('resume_pages', {})
 
     # Get database connection for duplicate checking
     conn = get_connection()
@@ -131,87 +222,55 @@ def fetch_and_store_profiles(output_file="startup_profiles_filtered_xxx.json"):
 
     try:
         # Start from where we left off in the alphabet
-        remaining_letters = [l for l in string.ascii_uppercase if l >= current_letter and l not in completed_letters]
+        # plus any earlier letter that was given up part-way through
+        remaining_letters = [
+            l for l in string.ascii_uppercase
+            if (l >= current_letter or l in resume_pages) and l not in completed_letters
+        ]
         
         for letter in remaining_letters:
             print(f"🔠 Searching for startups starting with '{letter}'...")
             
             # If it's a new letter, start from page 0
-            page = current_page if letter == current_letter else 0
+            if letter in resume_pages:
+                page = resume_pages.pop(letter)
+            else:
+                page = current_page if letter == current_letter else 0
+            failed_streak = 0
             
             while True:
-                print(f"  🔄 Fetching page {page} for query '{letter}'...")
-                payload = BASE_PAYLOAD.copy()
-                payload["query"] = letter
-                payload["page"] = page
+                # Failed pages wait in the delay queue; pick up any that are due first
+                retry_due_search_pages(cur, conn, channel, processed_ids)
 
+                print(f"  🔄 Fetching page {page} for query '{letter}'...")
                 try:
-                    response = make_search_api_request(payload)
-                    if response is None:
-                        raise Exception("API request failed after retries")
-                    response.raise_for_status()
-                    data = response.json()
-                except Exception as e:
+                    data = fetch_search_page(letter, page)
+                except RetryableError as e:
                     print(f"  ❌ Error on page {page} for query '{letter}': {e}")
-                    # Save progress before breaking
-                    save_progress(letter, page, processed_ids, completed_letters)
-                    break
+                    schedule_retry(SEARCH_PAGE_QUEUE, json.dumps({"letter": letter, "page": page}), 0, e, e.retry_after)
+                    failed_streak += 1
+                    if failed_streak >= MAX_CONSECUTIVE_PAGE_FAILURES:
+                        print(f"  ❌ {failed_streak} consecutive failures for query '{letter}', moving on.")
+                        # Failed pages are already in the delay queue; the next run resumes after them
+                        resume_pages[letter] = page + 1
+                        save_progress(letter, page + 1, processed_ids, completed_letters, resume_pages)
+                        break
+                    page += 1
+                    continue
+                failed_streak = 0
 
                 content = data.get("content", [])
                 if not content:
                     print(f"  ✅ No more results found for query '{letter}'.")
                     completed_letters.add(letter)
-                    save_progress(letter, page, processed_ids, completed_letters)
+                    save_progress(letter, page, processed_ids, completed_letters, resume_pages)
                     break
 
-                # Process and store profiles
-                batch = []
-                for item in content:
-                    profile_id = item.get("id")
-                    
-                    # Skip if we've already processed this ID
-                    if not profile_id or profile_id in processed_ids or check_duplicate_id(cur, profile_id):
-                        continue
-
-                    # Prepare data for database
-                    batch.append((
-                        profile_id,
-                        item.get("name"),
-                        item.get("country"),
-                        item.get("state"),
-                        item.get("city")
-                    ))
-                    
-                    # Send to RabbitMQ queue
-                    channel.basic_publish(
-                        exchange='',
-                        routing_key='profile_id_queue',
-                        body=profile_id,
-                        properties=pika.BasicProperties(
-                            delivery_mode=2,  # Make message persistent
-                        )
-                    )
-                    processed_ids.add(profile_id)
-
-                # Batch insert into database
-                if batch:
-                    try:
-                        args_str = ','.join(cur.mogrify('(%s,%s,%s,%s,%s)', x).decode('utf-8') for x in batch)
-                        cur.execute(
-                            f"""
-                            INSERT INTO search (profile_id, name, country, state, city)
-                            VALUES {args_str}
-                            ON CONFLICT (profile_id) DO NOTHING
-                            """
-                        )
-                        conn.commit()
-                        print(f"  ✅ Inserted {len(batch)} new profiles")
-                    except Exception as e:
-                        print(f"  ❌ Postgres batch insert error: {e}")
-                        conn.rollback()
+                if store_search_results(content, cur, conn, channel, processed_ids) is None:
+                    schedule_retry(SEARCH_PAGE_QUEUE, json.dumps({"letter": letter, "page": page}), 0, "Failed to store results")
 
                 # Save progress after each page
-                save_progress(letter, page, processed_ids, completed_letters)
+                save_progress(letter, page, processed_ids, completed_letters, resume_pages)
                 
                 page += 1
 
@@ -219,18 +278,125 @@ def fetch_and_store_profiles(output_file="startup_profiles_filtered_xxx.json"):
             current_letter = letter
             current_page = 0
 
+        # Wait out any failed pages that are still scheduled for a retry
+        wait_for_search_retries(cur, conn, channel, processed_ids)
+
     finally:
         cur.close()
         conn.close()
         connection.close()
+        close_archive()
         print(f"✅ Process completed. Processed {len(processed_ids)} unique profiles.")
         print(f"✅ Completed letters: {sorted(list(completed_letters))}")
 
+def wait_for_search_retries(cur, conn, channel, processed_ids):
+    """Block until every failed search page has been retried or dead-lettered."""
+    wait = seconds_until_next_due(SEARCH_PAGE_QUEUE)
+    while wait is not None:
+        print(f"⏳ Waiting {wait:.0f}s for pending search page retries...")
+        time.sleep(wait)
+        retry_due_search_pages(cur, conn, channel, processed_ids)
+        wait = seconds_until_next_due(SEARCH_PAGE_QUEUE)
+
+def check_newest_first(content):
+    """Fail loudly unless a delta page really is sorted by DELTA_SORT_FIELD, newest first.
+
+    If the API ignored the sort, the stale-page cutoff would end the refresh early.
+    """
+    values = [item.get(DELTA_SORT_FIELD) for item in content]
+    try:
+        ordered = None not in values and all(a >= b for a, b in zip(values, values[1:]))
+    except TypeError:
+        ordered = False
+    if not ordered:
+        raise RuntimeError(
+            f"Search results are not sorted by '{DELTA_SORT_FIELD}' newest first "
+            f"(got {values[:5]}); check DELTA_SORT_FIELD before running a delta refresh."
+        )
+
+def delta_refresh_profiles():
+    """Walk each letter newest-first and stop once pages stop yielding unseen profile IDs.
+
+    Known IDs on the pages walked are queued again; the profile stage's content
+    hash decides whether anything changed. Leaves the full-crawl progress file untouched.
+    """
+    connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
+    channel = connection.channel()
+    # Publishes return only once the broker has the message
+    channel.confirm_delivery()
+    channel.queue_declare(queue='profile_id_queue', durable=True)
+    conn = get_connection()
+    cur = conn.cursor()
+    processed_ids = set()
+
+    try:
+        # A rejected sort field would otherwise send every page to the retry queue
+        try:
+            check_newest_first(fetch_search_page("A", 0, delta=True).get("content", []))
+        except RetryableError as e:
+            raise RuntimeError(f"Delta sort probe failed ({e}); check DELTA_SORT_FIELD.")
+
+        for letter in string.ascii_uppercase:
+            print(f"🔠 Delta refresh for startups starting with '{letter}'...")
+            page = 0
+            stale_pages = 0
+            failed_streak = 0
+            while stale_pages < DELTA_STOP_PAGES:
+                retry_due_search_pages(cur, conn, channel, processed_ids)
+
+                print(f"  🔄 Fetching page {page} for query '{letter}' (newest first)...")
+                try:
+                    data = fetch_search_page(letter, page, delta=True)
+                except RetryableError as e:
+                    print(f"  ❌ Error on page {page} for query '{letter}': {e}")
+                    schedule_retry(
+                        SEARCH_PAGE_QUEUE, json.dumps({"letter": letter, "page": page, "delta": True}),
+                        0, e, e.retry_after
+                    )
+                    failed_streak += 1
+                    if failed_streak >= MAX_CONSECUTIVE_PAGE_FAILURES:
+                        print(f"  ❌ {failed_streak} consecutive failures for query '{letter}', moving on.")
+                        break
+                    page += 1
+                    continue
+                failed_streak = 0
+
+                content = data.get("content", [])
+                if not content:
+                    break
+                if page == 0:
+                    check_newest_first(content)
+                stored = store_search_results(content, cur, conn, channel, processed_ids, requeue_known=True)
+                if stored is None:
+                    schedule_retry(
+                        SEARCH_PAGE_QUEUE, json.dumps({"letter": letter, "page": page, "delta": True}),
+                        0, "Failed to store results"
+                    )
+                if stored:
+                    stale_pages = 0
+                else:
+                    stale_pages += 1
+                page += 1
+            print(f"  ✅ Letter '{letter}' done after {page} pages.")
+
+        wait_for_search_retries(cur, conn, channel, processed_ids)
+
+    finally:
+        cur.close()
+        conn.close()
+        connection.close()
+        close_archive()
+        print(f"✅ Delta refresh completed. Queued {len(processed_ids)} new or known profiles.")
+
 def main():
     # Start the profile consumer in the background
     subprocess.Popen(['python3', 'api/profile.py'])
     create_search_table()
-    fetch_and_store_profiles()
+    create_retry_tables()
+    if "--delta" in sys.argv:
+        delta_refresh_profiles()
+    else:
+        fetch_and_store_profiles()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,207 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import json
+import socket
+import string
+import time
+import pika
+from config import RABBITMQ_HOST, HTTP_ITEM_BUDGET
+from db.models import get_connection, create_search_table, create_retry_tables, create_crawl_partitions_table
+from api.archive import close_archive
+from api.retry import SEARCH_PAGE_QUEUE, RetryableError, schedule_retry
+from api.search import (
+    MAX_CONSECUTIVE_PAGE_FAILURES, fetch_search_page, store_search_results,
+    retry_due_search_pages, wait_for_search_retries
+)
+
+# A node must checkpoint within this many seconds or its partition can be taken over
+LEASE_SECONDS = 120
+# How long an idle node waits before checking for expired leases again
+IDLE_POLL_SECONDS = 30
+# Failed retries fetched per fresh page; each fetch can take HTTP_ITEM_BUDGET, and the
+# retries plus the fresh page must fit in one lease
+RETRIES_PER_PAGE = max(LEASE_SECONDS // HTTP_ITEM_BUDGET - 1, 0)
+# A partition given up after repeated failures can't be claimed again for this long
+FAILURE_COOLDOWN_SECONDS = 300
+
+def seed_partitions(queries=string.ascii_uppercase):
+    """Register search partitions; existing ones keep their progress."""
+    create_crawl_partitions_table()
+    conn = get_connection()
+    cur = conn.cursor()
+    args_str = ','.join(cur.mogrify('(%s,%s)', (query, query)).decode('utf-8') for query in queries)
+    cur.execute(
+        f"""
+        INSERT INTO crawl_partitions (partition_key, query)
+        VALUES {args_str}
+        ON CONFLICT (partition_key) DO NOTHING
+        """
+    )
+    conn.commit()
+    print(f"[✓] Seeded {cur.rowcount} new partitions ({len(queries)} requested).")
+    cur.close()
+    conn.close()
+
+def claim_partition(cur, conn, worker_id):
+    """Lease an unfinished partition that is free or whose lease or cool-down expired.
+
+    Returns (key, query, next_page) or None.
+    """
+    cur.execute(
+        """
+        UPDATE crawl_partitions SET
+            owner = %s,
+            lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+            updated_at = CURRENT_TIMESTAMP
+        WHERE partition_key = (
+            SELECT partition_key FROM crawl_partitions
+            WHERE NOT completed AND (lease_expires_at IS NULL OR lease_expires_at <= CURRENT_TIMESTAMP)
+            ORDER BY partition_key
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING partition_key, query, next_page
+        """,
+        (worker_id, LEASE_SECONDS)
+    )
+    row = cur.fetchone()
+    conn.commit()
+    return row
+
+def checkpoint(cur, conn, worker_id, partition_key, next_page):
+    """Record page progress and extend the lease. False means another node has taken the partition."""
+    cur.execute(
+        """
+        UPDATE crawl_partitions SET
+            next_page = %s,
+            lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+            updated_at = CURRENT_TIMESTAMP
+        WHERE partition_key = %s AND owner = %s
+        """,
+        (next_page, LEASE_SECONDS, partition_key, worker_id)
+    )
+    held = cur.rowcount == 1
+    conn.commit()
+    return held
+
+def release_partition(cur, conn, worker_id, partition_key, next_page, completed=False, cooldown=None):
+    """Give a partition up; with a cooldown, no node may claim it for that many seconds."""
+    cur.execute(
+        """
+        UPDATE crawl_partitions SET
+            next_page = %s,
+            completed = %s,
+            owner = NULL,
+            lease_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+            updated_at = CURRENT_TIMESTAMP
+        WHERE partition_key = %s AND owner = %s
+        """,
+        (next_page, completed, cooldown or 0, partition_key, worker_id)
+    )
+    conn.commit()
+
+def unfinished_partitions(cur):
+    cur.execute("SELECT COUNT(*) FROM crawl_partitions WHERE NOT completed")
+    return cur.fetchone()[0]
+
+def crawl_partition(cur, conn, channel, worker_id, partition_key, query, page, processed_ids):
+    """Page through one leased partition, checkpointing before every page."""
+    failed_streak = 0
+    try:
+        while True:
+            if not checkpoint(cur, conn, worker_id, partition_key, page):
+                print(f"  ⚠️ Lease on '{partition_key}' lost, leaving it to its new owner.")
+                return
+            retry_due_search_pages(cur, conn, channel, processed_ids, limit=RETRIES_PER_PAGE)
+
+            print(f"  🔄 [{worker_id}] Fetching page {page} for query '{query}'...")
+            try:
+                data = fetch_search_page(query, page)
+            except RetryableError as e:
+                print(f"  ❌ Error on page {page} for query '{query}': {e}")
+                schedule_retry(SEARCH_PAGE_QUEUE, json.dumps({"letter": query, "page": page}), 0, e, e.retry_after)
+                failed_streak += 1
+                if failed_streak >= MAX_CONSECUTIVE_PAGE_FAILURES:
+                    # The failed pages belong to the retry queue now, so the next owner resumes
+                    # after them, and only once the API had time to recover
+                    print(f"  ❌ {failed_streak} consecutive failures for query '{query}', "
+                          f"releasing partition for {FAILURE_COOLDOWN_SECONDS}s.")
+                    release_partition(
+                        cur, conn, worker_id, partition_key, page + 1, cooldown=FAILURE_COOLDOWN_SECONDS
+                    )
+                    return
+                page += 1
+                continue
+            failed_streak = 0
+
+            content = data.get("content", [])
+            if not content:
+                print(f"  ✅ No more results found for query '{query}'.")
+                release_partition(cur, conn, worker_id, partition_key, page, completed=True)
+                return
+            if store_search_results(content, cur, conn, channel, processed_ids) is None:
+                schedule_retry(SEARCH_PAGE_QUEUE, json.dumps({"letter": query, "page": page}), 0, "Failed to store results")
+            page += 1
+    except BaseException:
+        # Hand the partition back right away instead of waiting for the lease to expire
+        conn.rollback()
+        release_partition(cur, conn, worker_id, partition_key, page)
+        raise
+
+def run_worker(worker_id=None):
+    """Claim and crawl partitions until every partition is complete."""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    create_search_table()
+    create_retry_tables()
+    create_crawl_partitions_table()
+
+    connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
+    channel = connection.channel()
+    # Publishes return only once the broker has the message
+    channel.confirm_delivery()
+    channel.queue_declare(queue='profile_id_queue', durable=True)
+    conn = get_connection()
+    cur = conn.cursor()
+    processed_ids = set()
+    print(f"[*] Crawler node {worker_id} started.")
+
+    try:
+        while True:
+            partition = claim_partition(cur, conn, worker_id)
+            if partition is None:
+                if not unfinished_partitions(cur):
+                    break
+                # Everything left is leased by other nodes; wait in case one of them dies
+                retry_due_search_pages(cur, conn, channel, processed_ids)
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            partition_key, query, page = partition
+            print(f"🔠 [{worker_id}] Claimed partition '{partition_key}' at page {page}")
+            crawl_partition(cur, conn, channel, worker_id, partition_key, query, page, processed_ids)
+
+        wait_for_search_retries(cur, conn, channel, processed_ids)
+    finally:
+        cur.close()
+        conn.close()
+        connection.close()
+        close_archive()
+        print(f"✅ Crawler node {worker_id} finished. Queued {len(processed_ids)} profiles.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded search crawl with lease-based partition ownership.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    seed_parser = subparsers.add_parser("seed", help="register search partitions")
+    seed_parser.add_argument("queries", nargs="*", help="partition queries (default: A-Z)")
+    work_parser = subparsers.add_parser("work", help="claim and crawl partitions")
+    work_parser.add_argument("--worker-id", help="node name recorded on leases (default: host-pid)")
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        seed_partitions(args.queries or string.ascii_uppercase)
+    else:
+        run_worker(args.worker_id)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
+from db.models import get_connection
+from db.arrow import copy_to_arrow
+
+SNAPSHOT_PATH = "synced_data.arrow"
+CHUNK_SIZE = 200000
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("company_id", pa.int64()),
+    ("profile_id", pa.string()),
+    ("name", pa.string()),
+    ("country", pa.string()),
+    ("state", pa.dictionary(pa.int32(), pa.string())),
+    ("city", pa.dictionary(pa.int32(), pa.string())),
+    ("cin", pa.string()),
+    ("pan", pa.string()),
+    ("email", pa.string()),
+    ("email_normalized", pa.string()),
+    ("email_valid", pa.bool_()),
+    ("incorp_date", pa.string()),
+    ("incorp_date_parsed", pa.date32()),
+    ("registered_address", pa.string()),
+    ("pincode", pa.string()),
+    ("address_state", pa.dictionary(pa.int32(), pa.string())),
+    ("registered_contact", pa.string()),
+    ("contact_e164", pa.string()),
+    ("cin_status", pa.dictionary(pa.int32(), pa.string())),
+    ("synced_at", pa.timestamp("us", tz="UTC")),
+])
+DICTIONARY_COLUMNS = [f.name for f in SNAPSHOT_SCHEMA if pa.types.is_dictionary(f.type)]
+
+def _load_dictionaries(cur):
+    """One dictionary per encoded column, shared by every record batch in the file."""
+    dictionaries = {}
+    for column in DICTIONARY_COLUMNS:
+        cur.execute(f"SELECT DISTINCT {column} FROM synced_data WHERE {column} IS NOT NULL ORDER BY 1")
+        dictionaries[column] = pa.array([row[0] for row in cur.fetchall()], pa.string())
+    return dictionaries
+
+def _read_chunk(cur, after_id, chunk_size):
+    column_types = {
+        f.name: f.type.value_type if pa.types.is_dictionary(f.type) else f.type
+        for f in SNAPSHOT_SCHEMA
+    }
+    # Timestamps go out in UTC without an offset so the CSV reader parses them directly
+    column_types["synced_at"] = pa.timestamp("us")
+    select = ", ".join(
+        "synced_at AT TIME ZONE 'UTC'" if name == "synced_at" else name for name in column_types
+    )
+    return copy_to_arrow(
+        cur,
+        f"SELECT {select} FROM synced_data WHERE id > %s ORDER BY id LIMIT %s",
+        (after_id, chunk_size),
+        column_types
+    )
+
+def _encode(table, dictionaries):
+    columns = []
+    for field in SNAPSHOT_SCHEMA:
+        column = table[field.name].combine_chunks()
+        if field.name in dictionaries:
+            indices = pc.index_in(column, value_set=dictionaries[field.name]).cast(pa.int32())
+            column = pa.DictionaryArray.from_arrays(indices, dictionaries[field.name])
+        elif field.name == "synced_at":
+            column = column.cast(field.type)
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, schema=SNAPSHOT_SCHEMA)
+
+def write_snapshot(conn, path=SNAPSHOT_PATH, chunk_size=CHUNK_SIZE):
+    """Write synced_data to an uncompressed Arrow IPC (Feather v2) file that can be memory-mapped.
+
+    state, city, address_state and cin_status are dictionary-encoded. The file is written
+    next to `path` and swapped in atomically, so open snapshots stay valid.
+    """
+    start = time.time()
+    cur = conn.cursor()
+    tmp_path = f"{path}.tmp"
+    total = 0
+    try:
+        dictionaries = _load_dictionaries(cur)
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, SNAPSHOT_SCHEMA) as writer:
+            after_id = 0
+            while True:
+                table = _read_chunk(cur, after_id, chunk_size)
+                if table is None:
+                    break
+                writer.write_batch(_encode(table, dictionaries))
+                total += table.num_rows
+                after_id = pc.max(table["id"]).as_py()
+        os.replace(tmp_path, path)
+    finally:
+        conn.rollback()
+        cur.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"[✓] Wrote {total} rows to snapshot {path} in {time.time() - start:.1f}s")
+    return total
+
+def open_snapshot(path=SNAPSHOT_PATH, columns=None):
+    """Open a snapshot zero-copy: column buffers point into the memory-mapped file.
+
+    No Postgres connection is needed, and pages are only read from disk when touched.
+    """
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a memory-mappable Arrow snapshot of synced_data.")
+    parser.add_argument("--path", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+    conn = get_connection()
+    try:
+        write_snapshot(conn, args.path)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from db.models import get_connection, create_synced_data_table
+import argparse
+from db.models import get_connection, create_synced_data_table, create_cin_table, create_rollup_tables
+from api.resolve import resolve_companies
+try:
+    from api.normalize import normalize_synced_data
+    from api.snapshot import write_snapshot
+except ImportError:
+    # pyarrow is optional; without it the typed contact columns are left empty and no snapshot is written
+    normalize_synced_data = None
+    write_snapshot = None
 
-def sync():
+def sync(normalize=True, snapshot_path=None):
     create_synced_data_table()
+    create_cin_table()
+    # Triggers on synced_data and cin_details keep company_rollups current as rows are written
+    create_rollup_tables()
+    # Map any new profiles to companies so rows can be grouped by company_id
+    resolve_companies()
     conn = get_connection()
     cur = conn.cursor()
     # Clear the synced_data table before refreshing
@@ -12,7 +26,7 @@ def sync():
     # Join search, profile, cin_details
     cur.execute('''
         INSERT INTO synced_data (
-            profile_id, name, country, state, city, cin, pan, email, incorp_date, registered_address, registered_contact, cin_status, synced_at
+            profile_id, name, country, state, city, cin, pan, email, incorp_date, registered_address, registered_contact, cin_status, company_id, synced_at
         )
         SELECT
             s.profile_id,
@@ -27,16 +41,31 @@ def sync():
             c.registered_address,
             c.registered_contact,
             c.status as cin_status,
+            cp.company_id,
             CURRENT_TIMESTAMP
         FROM search s
         LEFT JOIN profile p ON s.profile_id = p.profile_id
         LEFT JOIN cin_details c ON p.cin = c.cin
+        LEFT JOIN company_profiles cp ON s.profile_id = cp.profile_id
         WHERE (c.email IS NOT NULL AND c.email <> '') OR (c.registered_contact IS NOT NULL AND c.registered_contact <> '')
     ''')
     conn.commit()
+    if normalize:
+        if normalize_synced_data is None:
+            print("⚠️ pyarrow is not installed, skipping contact normalization.")
+        else:
+            normalize_synced_data(conn)
+    if snapshot_path:
+        if write_snapshot is None:
+            print("⚠️ pyarrow is not installed, skipping the columnar snapshot.")
+        else:
+            write_snapshot(conn, snapshot_path)
     cur.close()
     conn.close()
     print("[✓] synced_data table updated.")
 
 if __name__ == "__main__":
-    sync()
+    parser = argparse.ArgumentParser(description="Rebuild synced_data from the crawled tables.")
+    parser.add_argument("--snapshot", metavar="PATH", help="also write a memory-mappable Arrow snapshot to PATH")
+    args = parser.parse_args()
+    sync(snapshot_path=args.snapshot)
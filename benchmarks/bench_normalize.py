@@ -0,0 +1,159 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import csv
+import io
+import re
+import time
+from datetime import datetime
+import numpy as np
+import pyarrow as pa
+from db.arrow import copy_to_arrow
+from api.normalize import (
+    normalize_batch, NORMALIZED_COLUMNS, EMAIL_PATTERN, PINCODE_PATTERN, STATE_PATTERN, STATE_LOOKUP, DATE_FORMATS
+)
+
+# Benchmark of api/normalize.py against a row-by-row baseline on synthetic synced_data rows.
+# Run: python benchmarks/bench_normalize.py --rows 1000000
+
+EMAIL_RE = re.compile(EMAIL_PATTERN)
+PINCODE_RE = re.compile(PINCODE_PATTERN)
+STATE_RE = re.compile(STATE_PATTERN)
+TIME_SUFFIX_RE = re.compile(r"[T ]\d{1,2}:\d{2}.*$")
+
+def normalize_row(row):
+    """The same rules applied one row at a time, as downstream consumers do today."""
+    email = re.split(r"[,;/\s]+", row["email"] or "", maxsplit=1)[0].strip().lower()
+    digits = re.sub(r"\D", "", re.split(r"[,;/]", row["registered_contact"] or "", maxsplit=1)[0])
+    national = None
+    if len(digits) == 10:
+        national = digits
+    elif len(digits) == 11 and digits.startswith("0"):
+        national = digits[1:]
+    elif len(digits) == 12 and digits.startswith("91"):
+        national = digits[2:]
+    elif len(digits) == 13 and digits.startswith("091"):
+        national = digits[3:]
+    if national and not re.match(r"^[1-9]\d{9}$", national):
+        national = None
+    date_text = TIME_SUFFIX_RE.sub("", (row["incorp_date"] or "").strip())
+    parsed_date = None
+    for fmt in DATE_FORMATS:
+        try:
+            parsed_date = datetime.strptime(date_text, fmt).date()
+            break
+        except ValueError:
+            continue
+    address = row["registered_address"] or ""
+    pin = PINCODE_RE.search(address)
+    state = STATE_RE.search(address.lower())
+    return {
+        "id": row["id"],
+        "email_normalized": email or None,
+        "email_valid": bool(EMAIL_RE.match(email)),
+        "contact_e164": f"+91{national}" if national else None,
+        "incorp_date_parsed": parsed_date,
+        "pincode": pin.group("head") + pin.group("tail") if pin else None,
+        "address_state": STATE_LOOKUP[state.group("state")] if state else None,
+    }
+
+def make_rows(n, seed=42):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n + 1)
+    local = rng.integers(6000000000, 9999999999, n).astype(str)
+    contacts = np.select(
+        [rng.random(n) < 0.4, rng.random(n) < 0.5, rng.random(n) < 0.5],
+        [np.char.add("+91-", local), np.char.add("0", local), np.char.add("91 ", local)],
+        default=np.char.add("", local),
+    )
+    contacts[rng.random(n) < 0.05] = ""
+    emails = np.char.add(np.char.add("Info", ids.astype(str)), "@Example.COM")
+    emails[rng.random(n) < 0.05] = "not-an-email"
+    years = rng.integers(1990, 2024, n).astype(str)
+    days = np.char.zfill(rng.integers(1, 28, n).astype(str), 2)
+    months = np.char.zfill(rng.integers(1, 13, n).astype(str), 2)
+    iso = np.char.add(np.char.add(np.char.add(np.char.add(years, "-"), months), "-"), days)
+    dmy = np.char.add(np.char.add(np.char.add(np.char.add(days, "/"), months), "/"), years)
+    dates = np.where(rng.random(n) < 0.5, iso, dmy)
+    states = np.array(["Karnataka", "Maharashtra", "Tamil Nadu", "West Bengal", "Orissa", "NCT of Delhi"])
+    pins = rng.integers(110001, 855999, n).astype(str)
+    addresses = np.char.add(
+        np.char.add(np.char.add("12, Main Road, Some City, ", states[rng.integers(0, len(states), n)]), ", India - "),
+        pins,
+    )
+    # Registered addresses are often multi-line
+    multiline = rng.random(n) < 0.2
+    addresses[multiline] = np.char.replace(addresses[multiline], "Main Road, ", "Main Road,\n")
+    return pa.table({
+        "id": ids,
+        "email": emails.tolist(),
+        "incorp_date": dates.tolist(),
+        "registered_address": addresses.tolist(),
+        "registered_contact": contacts.tolist(),
+    })
+
+class CopyCursor:
+    """Stands in for a psycopg2 cursor whose COPY ... TO STDOUT returns pre-rendered CSV."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def mogrify(self, query, params):
+        return query.encode("utf-8")
+
+    def copy_expert(self, sql, buf):
+        buf.write(self.data)
+
+def to_copy_csv(table):
+    """Render rows the way Postgres COPY (FORMAT csv) does: quoted only when needed, NULL as empty."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for row in table.to_pylist():
+        writer.writerow(["" if value is None else value for value in row.values()])
+    return out.getvalue().encode("utf-8")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized vs per-row contact normalization.")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--chunk-size", type=int, default=200000)
+    args = parser.parse_args()
+
+    table = make_rows(args.rows)
+    n = table.num_rows
+    print(f"Generated {n} synthetic rows")
+
+    # Parse each chunk back the way _read_chunk does, so multi-line addresses in COPY output are covered
+    column_types = {name: pa.int64() if name == "id" else pa.string() for name in table.column_names}
+    chunks = [to_copy_csv(table.slice(i, args.chunk_size)) for i in range(0, n, args.chunk_size)]
+    start = time.perf_counter()
+    parsed = pa.concat_tables([copy_to_arrow(CopyCursor(chunk), "", None, column_types) for chunk in chunks])
+    parse_secs = time.perf_counter() - start
+    if parsed["registered_address"].to_pylist() != table["registered_address"].to_pylist():
+        print("⚠️ registered_address did not survive the COPY CSV round trip")
+
+    start = time.perf_counter()
+    vectorized = pa.concat_tables(
+        [normalize_batch(table.slice(i, args.chunk_size)) for i in range(0, n, args.chunk_size)]
+    )
+    vectorized_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    baseline = [normalize_row(row) for row in table.to_pylist()]
+    baseline_secs = time.perf_counter() - start
+
+    for column in NORMALIZED_COLUMNS:
+        mismatches = sum(
+            1 for left, right in zip(vectorized[column].to_pylist(), (row[column] for row in baseline))
+            if left != right
+        )
+        if mismatches:
+            print(f"⚠️ {column}: {mismatches} rows differ from the per-row baseline")
+
+    print(f"COPY parse: {parse_secs:8.2f}s  {n / parse_secs:12,.0f} rows/s")
+    print(f"vectorized: {vectorized_secs:8.2f}s  {n / vectorized_secs:12,.0f} rows/s")
+    print(f"per-row:    {baseline_secs:8.2f}s  {n / baseline_secs:12,.0f} rows/s")
+    print(f"speedup:    {baseline_secs / vectorized_secs:8.1f}x")
+
+if __name__ == "__main__":
+    main()
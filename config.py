@@ -6,6 +6,27 @@ DB_CONFIG = {
     "port": 5432
 }
 
+# RabbitMQ broker shared by every crawler node
+RABBITMQ_HOST = "localhost"
+
 SEARCH_API_URL = "https://api.startupindia.gov.in/sih/api/noauth/search/profiles"
 PROFILE_API_URL = "https://api.startupindia.gov.in/sih/api/common/replica/user/profile/{profile_id}"
-CIN_API_URL = "https://api.startupindia.gov.in/sih/api/noauth/dpiit/services/cin/info?cin={cin}"
\ No newline at end of file
+CIN_API_URL = "https://api.startupindia.gov.in/sih/api/noauth/dpiit/services/cin/info?cin={cin}"
+
+# HTTP deadlines (seconds). Connect/read timeouts apply per socket operation,
+# the item budget caps the whole fetch of one item including any hedge.
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 20
+HTTP_ITEM_BUDGET = 45
+
+# Hedged requests: when an attempt runs longer than HEDGE_PERCENTILE of recent
+# latencies, fire a second one and take whichever answers first. HEDGE_BUDGET
+# caps hedges as a fraction of all requests.
+HEDGE_ENABLED = False
+HEDGE_PERCENTILE = 95
+HEDGE_BUDGET = 0.05
+
+# Raw-response archive: compressed, content-addressed segment files under
+# ARCHIVE_DIR, indexed in Postgres. Replay with `python api/archive.py replay`.
+ARCHIVE_ENABLED = False
+ARCHIVE_DIR = "archive"
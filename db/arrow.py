@@ -0,0 +1,33 @@
+# db/arrow.py
+import io
+import pyarrow.csv as pa_csv
+
+def copy_to_arrow(cur, query, params, column_types):
+    """Run a SELECT through COPY ... TO STDOUT and parse the CSV straight into an Arrow table.
+
+    column_types maps every selected column, in order, to its Arrow type.
+    Returns None when the query produced no rows.
+    """
+    buf = io.BytesIO()
+    cur.copy_expert(
+        f"COPY ({cur.mogrify(query, params).decode('utf-8')}) TO STDOUT WITH (FORMAT csv)",
+        buf
+    )
+    if not buf.tell():
+        return None
+    buf.seek(0)
+    return pa_csv.read_csv(
+        buf,
+        read_options=pa_csv.ReadOptions(column_names=list(column_types)),
+        # Quoted values such as registered addresses can span lines
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types,
+            # COPY writes NULL as an empty field and '' as "", so only the former is null
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            # Postgres writes booleans as t/f
+            true_values=["t", "true"],
+            false_values=["f", "false"]
+        )
+    )
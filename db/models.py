@@ -23,6 +23,43 @@ def create_search_table():
     conn.commit()
     cur.close()
     conn.close()
+    create_name_search_index()
+
+def create_search_extensions():
+    """One-time setup: enable pg_trgm. Needs a role allowed to create extensions."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def create_name_search_index():
+    """Trigram and prefix indexes on search names for local fuzzy lookups.
+
+    The trigram index is GiST so fuzzy lookups can walk it nearest-first and stop
+    after a few rows. It is skipped until pg_trgm has been enabled with
+    create_search_extensions(). Postgres keeps these up to date as the crawler inserts rows.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    if cur.fetchone():
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS search_name_trgm_gist_idx
+                ON search USING gist (lower(name) gist_trgm_ops);
+        """)
+    else:
+        print("⚠️ pg_trgm is not enabled, skipping the fuzzy name index (run: python api/lookup.py --setup)")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS search_name_prefix_idx
+            ON search (lower(name) text_pattern_ops);
+        CREATE INDEX IF NOT EXISTS search_state_city_idx
+            ON search (lower(state), lower(city));
+    """)
+    conn.commit()
+    cur.close()
+    conn.close()
 
 def create_profile_table():
     """Create the profile table if it does not exist."""
@@ -35,6 +72,7 @@ def create_profile_table():
             cin TEXT,
             pan TEXT
         );
+        ALTER TABLE profile ADD COLUMN IF NOT EXISTS content_hash TEXT;
     """)
     conn.commit()
     cur.close()
@@ -56,6 +94,7 @@ def create_cin_table():
             status TEXT,
             created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         );
+        ALTER TABLE cin_details ADD COLUMN IF NOT EXISTS content_hash TEXT;
     """)
     conn.commit()
     cur.close()
@@ -81,33 +120,58 @@ def create_synced_data_table():
             cin_status TEXT,
             synced_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         );
+        ALTER TABLE synced_data
+            ADD COLUMN IF NOT EXISTS email_normalized TEXT,
+            ADD COLUMN IF NOT EXISTS email_valid BOOLEAN,
+            ADD COLUMN IF NOT EXISTS contact_e164 TEXT,
+            ADD COLUMN IF NOT EXISTS incorp_date_parsed DATE,
+            ADD COLUMN IF NOT EXISTS pincode TEXT,
+            ADD COLUMN IF NOT EXISTS address_state TEXT,
+            ADD COLUMN IF NOT EXISTS company_id INTEGER;
     """)
     conn.commit()
     cur.close()
     conn.close()
 
 def batch_insert_profiles(profiles):
-    """Insert a batch of profile dicts into the profile table."""
+    """Insert a batch of profile dicts into the profile table. Returns False if the insert failed."""
     if not profiles:
-        return
+        return True
     conn = get_connection()
     cur = conn.cursor()
     try:
         args_list = [
-            (p["profile_id"], p["cin"], p["pan"])
+            (p["profile_id"], p["cin"], p["pan"], p.get("content_hash"))
             for p in profiles
         ]
-        args_str = ','.join(cur.mogrify('(%s,%s,%s)', x).decode('utf-8') for x in args_list)
+        args_str = ','.join(cur.mogrify('(%s,%s,%s,%s)', x).decode('utf-8') for x in args_list)
         cur.execute(
             f"""
-            INSERT INTO profile (profile_id, cin, pan)
+            INSERT INTO profile (profile_id, cin, pan, content_hash)
             VALUES {args_str}
-            ON CONFLICT (profile_id) DO NOTHING;
+            ON CONFLICT (profile_id) DO UPDATE SET
+                cin = EXCLUDED.cin,
+                pan = EXCLUDED.pan,
+                content_hash = EXCLUDED.content_hash;
             """
         )
         conn.commit()
+        return True
     except Exception as e:
         print(f"❌ Postgres batch insert error: {e}")
+        conn.rollback()
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+def load_content_hashes(table, key_column):
+    """Return {key: content_hash} for every row of profile or cin_details that has a hash."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT {key_column}, content_hash FROM {table} WHERE content_hash IS NOT NULL")
+        return dict(cur.fetchall())
     finally:
         cur.close()
         conn.close()
@@ -147,9 +211,9 @@ def insert_cin_details(cin_info):
         conn.close()
 
 def batch_insert_cin_details(cin_details_list):
-    """Insert a batch of CIN details into the cin_details table."""
+    """Insert a batch of CIN details into the cin_details table. Returns False if the insert failed."""
     if not cin_details_list:
-        return
+        return True
     conn = get_connection()
     cur = conn.cursor()
     try:
@@ -161,14 +225,15 @@ def batch_insert_cin_details(cin_details_list):
                 c["incorpdate"],
                 c["registeredAddress"],
                 c["registeredContactNo"],
-                c["status"]
-            ) for c in cin_details_list
+                c["status"],
+                c.get("content_hash")
+            ) for c in sorted(cin_details_list, key=lambda c: c["cin"] or "")
         ]
-        args_str = ','.join(cur.mogrify('(%s,%s,%s,%s,%s,%s,%s)', x).decode('utf-8') for x in args_list)
+        args_str = ','.join(cur.mogrify('(%s,%s,%s,%s,%s,%s,%s,%s)', x).decode('utf-8') for x in args_list)
         cur.execute(
             f"""
             INSERT INTO cin_details 
-            (profile_id, cin, email, incorp_date, registered_address, registered_contact, status)
+            (profile_id, cin, email, incorp_date, registered_address, registered_contact, status, content_hash)
             VALUES {args_str}
             ON CONFLICT (cin) DO UPDATE SET
                 profile_id = EXCLUDED.profile_id,
@@ -177,14 +242,256 @@ def batch_insert_cin_details(cin_details_list):
                 registered_address = EXCLUDED.registered_address,
                 registered_contact = EXCLUDED.registered_contact,
                 status = EXCLUDED.status,
+                content_hash = EXCLUDED.content_hash,
                 created_at = CURRENT_TIMESTAMP;
             """
         )
         conn.commit()
+        return True
     except Exception as e:
         print(f"❌ Postgres batch insert error for CIN details: {e}")
+        conn.rollback()
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+
+def create_retry_tables():
+    """Create the retry_queue and dead_letters tables if they do not exist."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS retry_queue (
+            id SERIAL PRIMARY KEY,
+            queue_name TEXT NOT NULL,
+            body TEXT NOT NULL,
+            attempt INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS retry_queue_due_idx
+            ON retry_queue (queue_name, next_attempt_at);
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            id SERIAL PRIMARY KEY,
+            queue_name TEXT NOT NULL,
+            body TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            last_error TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def create_archive_tables():
+    """Create the archive_blobs and archive_index tables if they do not exist."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS archive_blobs (
+            digest TEXT PRIMARY KEY,
+            segment TEXT NOT NULL,
+            byte_offset BIGINT NOT NULL,
+            length INTEGER NOT NULL,
+            raw_length INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS archive_index (
+            id SERIAL PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            ref TEXT,
+            digest TEXT NOT NULL REFERENCES archive_blobs (digest),
+            archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (kind, key, digest)
+        );
+    """)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def batch_insert_search(rows):
+    """Insert (profile_id, name, country, state, city) rows into the search table."""
+    if not rows:
+        return
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        args_str = ','.join(cur.mogrify('(%s,%s,%s,%s,%s)', x).decode('utf-8') for x in rows)
+        cur.execute(
+            f"""
+            INSERT INTO search (profile_id, name, country, state, city)
+            VALUES {args_str}
+            ON CONFLICT (profile_id) DO NOTHING;
+            """
+        )
+        conn.commit()
+    except Exception as e:
+        print(f"❌ Postgres batch insert error for search rows: {e}")
     finally:
         cur.close()
         conn.close()
 
+def create_company_tables():
+    """Create the companies and company_profiles tables if they do not exist."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS companies (
+            company_id SERIAL PRIMARY KEY,
+            cin TEXT,
+            pan TEXT,
+            name_key TEXT,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS company_profiles (
+            profile_id TEXT PRIMARY KEY,
+            company_id INTEGER NOT NULL,
+            cin TEXT,
+            pan TEXT,
+            name_key TEXT
+        );
+        CREATE INDEX IF NOT EXISTS company_profiles_company_idx ON company_profiles (company_id);
+        CREATE INDEX IF NOT EXISTS company_profiles_cin_idx ON company_profiles (cin);
+        CREATE INDEX IF NOT EXISTS company_profiles_pan_idx ON company_profiles (pan);
+        CREATE INDEX IF NOT EXISTS company_profiles_name_key_idx ON company_profiles (name_key);
+    """)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+def create_crawl_partitions_table():
+    """Create the crawl_partitions table used to lease search partitions to crawler nodes."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_partitions (
+            partition_key TEXT PRIMARY KEY,
+            query TEXT NOT NULL,
+            next_page INTEGER NOT NULL DEFAULT 0,
+            completed BOOLEAN NOT NULL DEFAULT FALSE,
+            owner TEXT,
+            lease_expires_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+# (dimension, expression over a synced_data/cin_details row `r`) pairs kept in company_rollups
+ROLLUP_DIMENSIONS = {
+    "synced_data": [
+        ("all", "''"),
+        ("state", "COALESCE(r.state, '')"),
+        ("city", "COALESCE(r.state, '') || '|' || COALESCE(r.city, '')"),
+        ("incorp_year", "COALESCE(EXTRACT(YEAR FROM r.incorp_date_parsed)::INTEGER::TEXT, '')"),
+        ("cin_status", "COALESCE(r.cin_status, '')"),
+    ],
+    "cin_details": [
+        ("cin_lookup", "''"),
+        ("cin_lookup_status", "split_part(COALESCE(r.status, ''), ':', 1)"),
+    ],
+}
+
+def _rollup_upsert_sql(table, source):
+    """Add the signed rows produced by `source` (a query with a `sign` column) into company_rollups."""
+    dimensions = ", ".join(f"('{name}', {expr})" for name, expr in ROLLUP_DIMENSIONS[table])
+    return f"""
+        INSERT INTO company_rollups (dimension, value, profiles, with_email, with_contact)
+        SELECT d.dimension, d.value,
+               SUM(r.sign),
+               SUM(r.sign * (COALESCE(r.email, '') <> '')::INTEGER),
+               SUM(r.sign * (COALESCE(r.registered_contact, '') <> '')::INTEGER)
+        FROM ({source}) r
+        CROSS JOIN LATERAL (VALUES {dimensions}) AS d(dimension, value)
+        GROUP BY d.dimension, d.value
+        -- Lock rollup rows in key order so concurrent writers cannot deadlock
+        ORDER BY d.dimension, d.value
+        ON CONFLICT (dimension, value) DO UPDATE SET
+            profiles = company_rollups.profiles + EXCLUDED.profiles,
+            with_email = company_rollups.with_email + EXCLUDED.with_email,
+            with_contact = company_rollups.with_contact + EXCLUDED.with_contact,
+            updated_at = CURRENT_TIMESTAMP
+    """
+
+def _rollup_reset_sql(table):
+    names = ", ".join(f"'{name}'" for name, _ in ROLLUP_DIMENSIONS[table])
+    return f"DELETE FROM company_rollups WHERE dimension IN ({names})"
 
+def create_rollup_tables():
+    """Create company_rollups and the statement-level triggers that keep it in step with
+    synced_data and cin_details. Call after both tables exist."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass('company_rollups') IS NULL")
+    first_install = cur.fetchone()[0]
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS company_rollups (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            profiles BIGINT NOT NULL DEFAULT 0,
+            with_email BIGINT NOT NULL DEFAULT 0,
+            with_contact BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (dimension, value)
+        );
+    """)
+    for table in ROLLUP_DIMENSIONS:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+        if not cur.fetchone()[0]:
+            continue
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION rollup_{table}() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    {_rollup_upsert_sql(table, "SELECT 1 AS sign, * FROM new_rows")};
+                ELSIF TG_OP = 'DELETE' THEN
+                    {_rollup_upsert_sql(table, "SELECT -1 AS sign, * FROM old_rows")};
+                ELSIF TG_OP = 'UPDATE' THEN
+                    {_rollup_upsert_sql(table, "SELECT -1 AS sign, * FROM old_rows UNION ALL SELECT 1 AS sign, * FROM new_rows")};
+                ELSE
+                    {_rollup_reset_sql(table)};
+                END IF;
+                RETURN NULL;
+            END
+            $$;
+            DROP TRIGGER IF EXISTS {table}_rollup_insert ON {table};
+            CREATE TRIGGER {table}_rollup_insert AFTER INSERT ON {table}
+                REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION rollup_{table}();
+            DROP TRIGGER IF EXISTS {table}_rollup_update ON {table};
+            CREATE TRIGGER {table}_rollup_update AFTER UPDATE ON {table}
+                REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION rollup_{table}();
+            DROP TRIGGER IF EXISTS {table}_rollup_delete ON {table};
+            CREATE TRIGGER {table}_rollup_delete AFTER DELETE ON {table}
+                REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION rollup_{table}();
+            DROP TRIGGER IF EXISTS {table}_rollup_truncate ON {table};
+            CREATE TRIGGER {table}_rollup_truncate AFTER TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION rollup_{table}();
+        """)
+    conn.commit()
+    cur.close()
+    conn.close()
+    if first_install:
+        # Rows written before the triggers existed are not counted yet
+        rebuild_rollups()
+
+def rebuild_rollups():
+    """Recompute company_rollups from scratch, e.g. for rows written before the triggers existed."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("TRUNCATE company_rollups")
+        for table in ROLLUP_DIMENSIONS:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+            if cur.fetchone()[0]:
+                cur.execute(_rollup_upsert_sql(table, f"SELECT 1 AS sign, * FROM {table}"))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
@@ -1,9 +1,14 @@
-from api.search import fetch_and_store_profiles
-from db.models import create_search_table
+import sys
+from api.search import fetch_and_store_profiles, delta_refresh_profiles
+from db.models import create_search_table, create_retry_tables
 
 def main():
     create_search_table()
-    fetch_and_store_profiles()
+    create_retry_tables()
+    if "--delta" in sys.argv:
+        delta_refresh_profiles()
+    else:
+        fetch_and_store_profiles()
     # next: save to DB in batches
 
 if __name__ == "__main__":
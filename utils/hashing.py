@@ -0,0 +1,7 @@
+import hashlib
+import json
+
+def content_hash(*fields):
+    """Stable hash of the given response fields, used to skip rewriting unchanged records."""
+    payload = json.dumps(fields, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()